@@ -4,72 +4,113 @@ Created on Tue Apr 16 00:06:13 2024
 
 @author: eljac
 """
+import profiling
+
+_MISSING = object()
+
+
+def parse_par(text):
+    """
+    Tokenize the text of a .par file in a single pass, into a dict of KEY -> value (str).
+    Each line is "KEY value", keys are matched exactly and later occurrences take precedence.
+    """
+    params = dict()
+    for line in text.splitlines():
+        parts = line.split(None, 1)
+        if parts:
+            params[parts[0]] = parts[1].strip() if len(parts) > 1 else ""
+    return params
+
+
 # Class to store all the (relevant) scan parameters, returned by the function
 class scan_params():
     def __init__(self, text, silent=True):
-        self.file_length = int(text.split("ANZ ")[-1].split("\n")[0].strip())  # = x_res*y_scans
-        self.y_min = float(text.split("MIN ")[-1].split("\n")[0].strip())  # ?
-        self.y_max = float(text.split("MAX ")[-1].split("\n")[0].strip())  # ?
-        #self.JSS = int(text.split("JSS ")[-1].split("\n")[0].strip())  # ?
+        self.params = parse_par(text)  # All KEY -> value pairs of the .par file
+        self.file_length = self.get_int("ANZ")  # = x_res*y_scans
+        self.y_min = self.get_float("MIN")  # ?
+        self.y_max = self.get_float("MAX")  # ?
+        #self.JSS = self.get_int("JSS")  # ?
 
         # Below is stuff for 2D scans, ignore for 1D
         try:
-            self.x_len = int(text.split("SSX ")[-1].split("\n")[0].strip())
-            self.y_num = int(text.split("SSY ")[-1].split("\n")[0].strip())
-            self.x0 = float(text.split("XXLB ")[-1].split("\n")[0].strip())
-            self.x_range = float(text.split("XXWI ")[-1].split("\n")[0].strip())
-            self.y0 = float(text.split("XYLB ")[-1].split("\n")[0].strip())
-            self.y_range = float(text.split("XYWI ")[-1].split("\n")[0].strip())
-            self.x_unit = text.split("XXUN ")[-1].split("\n")[0].strip()
-            self.y_unit = text.split("XYUN ")[-1].split("\n")[0].strip()
-        except:
+            self.x_len = self.get_int("SSX")
+            self.y_num = self.get_int("SSY")
+            self.x0 = self.get_float("XXLB")
+            self.x_range = self.get_float("XXWI")
+            self.y0 = self.get_float("XYLB")
+            self.y_range = self.get_float("XYWI")
+            self.x_unit = self.get_str("XXUN")
+            self.y_unit = self.get_str("XYUN")
+        except (KeyError, ValueError):
             self.y_num = 1
-            pass
 
-        self.system = text.split("JON ")[-1].split("\n")[0].strip()
-        self.date = text.split("JDA ")[-1].split("\n")[0].strip()
-        self.time = text.split("JTM ")[-1].split("\n")[0].strip()
-        self.calibration_file = text.split("JRE ")[-1].split("\n")[0].strip()
+        self.system = self.get_str("JON", "")
+        self.date = self.get_str("JDA", "")
+        self.time = self.get_str("JTM", "")
+        self.calibration_file = self.get_str("JRE", "")
 
-        self.x_scan_type = text.split("JEX ")[-1].split("\n")[0].strip()
+        self.x_scan_type = self.get_str("JEX", "")
         try:
-            self.y_scan_type = text.split("JEY ")[-1].split("\n")[0].strip()
+            self.y_scan_type = self.get_str("JEY")
             self.x_res = self.x_len
             if not silent: print("2D scan")
-        except:
+        except (KeyError, AttributeError):
             self.y_scan_type = None
             self.x_res = self.file_length
             if not silent: print("1D scan")
 
-        #self.JSD = int(text.split("JSD ")[-1].split("\n")[0].strip())  # ?
-        #self.CCF = int(text.split("CCF ")[-1].split("\n")[0].strip())  # ?
+        #self.JSD = self.get_int("JSD")  # ?
+        #self.CCF = self.get_int("CCF")  # ?
+
+        self.field_centre = self.get_float("HCF")
+        self.field_sweep_width = self.get_float("HSW")
+
+        self.conv_time = self.get_float("RCT")
+        self.time_constant = self.get_float("RTC")
+        self.receiver_gain = self.get_float("RRG")
+        self.mod_amp = self.get_float("RMA")
 
-        self.field_centre = float(text.split("HCF ")[-1].split("\n")[0].strip())
-        self.field_sweep_width = float(text.split("HSW ")[-1].split("\n")[0].strip())
+        self.freq = self.get_float("MF")
+        self.power_uW = self.get_float("MP")
+        self.attenuation = self.get_float("MPD")
+        self.gonio = self.get_float("GAN", None)
+        self.gonio_step = self.get_float("GANS")
 
-        self.conv_time = float(text.split("RCT ")[-1].split("\n")[0].strip())
-        self.time_constant = float(text.split("RTC ")[-1].split("\n")[0].strip())
-        self.receiver_gain = float(text.split("RRG ")[-1].split("\n")[0].strip())
-        self.mod_amp = float(text.split("RMA ")[-1].split("\n")[0].strip())
+    # Typed accessors for any parameter of the .par file, raise KeyError if missing (and no default)
+    def get_str(self, key, default=_MISSING):
+        if key not in self.params:
+            if default is _MISSING:
+                raise KeyError(f"Parameter '{key}' not in .par file")
+            return default
+        return self.params[key]
+
+    def get_float(self, key, default=_MISSING):
+        try:
+            return float(self.get_str(key))
+        except (KeyError, ValueError):
+            if default is _MISSING:
+                raise
+            return default
 
-        self.freq = float(text.split("MF ")[-1].split("\n")[0].strip())
-        self.power_uW = float(text.split("MP ")[-1].split("\n")[0].strip())
-        self.attenuation = float(text.split("MPD ")[-1].split("\n")[0].strip())
+    def get_int(self, key, default=_MISSING):
         try:
-            self.gonio = float(text.split("GAN ")[-1].split("\n")[0].strip())
-        except:
-            self.gonio = None
-        self.gonio_step = float(text.split("GANS ")[-1].split("\n")[0].strip())
+            return int(self.get_str(key))
+        except (KeyError, ValueError):
+            if default is _MISSING:
+                raise
+            return default
 
 
 def get_scan_params(file_name, silent=True):
-    if file_name[-4:] == ".spc" or file_name[-4:] == ".par":
+    if file_name[-4:].lower() == ".spc" or file_name[-4:].lower() == ".par":
         file_name = file_name[:-4]
 
-    with open(file_name + '.par', "r") as fl:
-        text = fl.read()
+    with profiling.stage("fmr.get_scan_params"):
+        with open(file_name + '.par', "r") as fl:
+            text = fl.read()
+        profiling.add_bytes("fmr.get_scan_params", len(text))
 
-    params = scan_params(text, silent=silent)
+        params = scan_params(text, silent=silent)
 
     return params
 
@@ -10,63 +10,158 @@ File format known from "A Brief Guide to SPC File Format" by Thermo Galactic, 20
 import os
 import numpy as np
 from BrukerFMR_par_import import get_scan_params
+from text_writer import write_columns
+import profiling
 
 
-def create_csv(spc_file, silent=True):
+def _field_axis(pars):
+    """Magnetic field values (mT) of each point along the x (field) dimension."""
+    B_0, B_w = pars.field_centre, pars.field_sweep_width
+    return np.linspace(B_0 - B_w/2, B_0 + B_w/2, pars.x_res) * 0.1  # mT
+
+
+def _angles(pars):
+    """Gonio angle of each slice of a 2D angle-sweep."""
+    n, angle, ang_step = pars.y_num, pars.gonio, pars.gonio_step
+    return (angle + ang_step*np.arange(n)) % 360  # Not a float step arange, which can overshoot by one
+
+
+def _y_axis(pars):
+    """Value of the second (y) dimension of each slice of a 2D scan, the gonio angles for angle-sweeps."""
+    if pars.y_scan_type == "angle-sweep":
+        return _angles(pars)
+    return np.linspace(pars.y0, pars.y0 + pars.y_range, pars.y_num)
+
+
+def iter_spc_slices(spc_file, silent=True, pars=None):
+    """
+    Stream a (2D) .spc file one slice at a time, with bounded memory.
+    The file is memory-mapped and each slice is yielded as (y, B, signal), where signal is a
+    read-only, zero-copy view into the file and B the field axis (mT). For 2D scans y is the
+    value of the second dimension (e.g. the gonio angle for angle-sweeps, the time for
+    time-sweeps, in pars.y_unit). 1D scans yield a single slice, with y the gonio angle.
+
+    Parameters
+    ----------
+    spc_file : str
+        Path to the .spc file, with its .par file alongside.
+    pars : scan_params, optional
+        Already parsed parameters of the file, read from the .par file if None.
+    """
+    pars = pars if pars is not None else get_scan_params(spc_file, silent=silent)
+    n, l = pars.y_num, pars.x_res
+    B = _field_axis(pars)
+    ys = _y_axis(pars) if n > 1 else [pars.gonio]
+
+    signals = np.memmap(spc_file, dtype="<f4", mode="r", shape=(n, l))
+    for y_i, y in zip(ys, signals):
+        yield y_i, B, y
+
+
+def load_arrays(spc_file, pars):
+    """
+    The field axis "B" (mT) and the "signal" of an .spc file with parameters `pars`.
+    2D scans have a (y_num, x_res) signal, its y axis "y", and for angle-sweeps the gonio angles "angle".
+    """
     data = np.fromfile(spc_file, dtype="<f4")
+    arrays = {"B": _field_axis(pars), "signal": data}
+    if pars.y_num > 1:
+        arrays["signal"] = data.reshape(pars.y_num, pars.x_res)
+        arrays["y"] = _y_axis(pars)
+        if pars.y_scan_type == "angle-sweep":
+            arrays["angle"] = _angles(pars)
+    return arrays
+
+
+@profiling.profiled("fmr.create_csv")
+def create_csv(spc_file, silent=True, overwrite=False, layout="slices"):
+    """
+    Convert an .spc/.par pair to .csv, next to the .spc file.
+
+    1D scans are written to one "<name>.csv" of field (mT) and signal. For 2D scans (angle, time,
+    power, frequency... sweeps) `layout` chooses the output:
+        "slices": one csv per slice, "<y><unit>_from_2D.csv" (e.g. "120deg_from_2D.csv").
+        "wide": a single "<name>_2D.csv" of the field and one signal column per slice.
+        "binary": a single "<name>.npz" with create_binary, the fastest to write and read.
+    Existing files are kept unless `overwrite`. Returns the list of files written.
+    """
+    assert layout in ("slices", "wide", "binary"), f"Unknown layout '{layout}', use 'slices', 'wide' or 'binary'"
+    profiling.add_bytes("fmr.create_csv", os.path.getsize(spc_file))
     pars = get_scan_params(spc_file, silent=silent)
 
-    # If the second dimension is an angular scan, get the angles
-    angle = pars.gonio
-
     # Microwave bridge conditions
     freq, attenuation = pars.freq, pars.attenuation
-
-    # Field information
-    l = pars.x_res
-    B_0, B_w = pars.field_centre, pars.field_sweep_width
-    B = np.linspace(B_0 - B_w/2, B_0 + B_w/2, l) * 0.1  # mT
+    written = []
 
     if pars.y_num > 1:
-        n = pars.y_num
-
-        # Split the data into the sub-files
-        signals = data.reshape(n,l)
-
-        # If the second dimension is an angular scan, get the angles
-        ang_step = pars.gonio_step
-        if pars.y_scan_type == "angle-sweep":
-            angles = np.arange(angle, angle + n*ang_step, ang_step) % 360
-
-            for angle_i, y in zip(angles, signals):
-                path = '/'.join( spc_file.replace("\\","/").split('/')[:-1] )
-                csv_file = path + f"/{angle_i:.0f}deg_from_2D" + ".csv"
+        y_unit = pars.y_unit if pars.y_scan_type != "angle-sweep" else "deg"
+
+        # Write the whole 2D block to a single file
+        if layout == "binary":
+            written += create_binary(spc_file, silent=silent, overwrite=overwrite)
+        elif layout == "wide":
+            csv_file = f"{spc_file[:-4]}_2D.csv"
+            ys = _y_axis(pars)
+            signals = np.memmap(spc_file, dtype="<f4", mode="r", shape=(pars.y_num, pars.x_res))
+            header = "Field (mT), " + ", ".join(f"{y_i:g} {y_unit}" for y_i in ys)
+            if overwrite or not os.path.exists(csv_file):
+                print(csv_file)
+                write_columns(csv_file, (_field_axis(pars), *signals),
+                              fmt='%12.4f' + ',\t%14.3f'*pars.y_num, header=header)
+                written.append(csv_file)
+
+        # Stream the slice at each value of the second dimension to its own file
+        else:
+            path = os.path.dirname(spc_file)
+            y_fmt = "{:.0f}" if pars.y_scan_type == "angle-sweep" else "{:g}"
+            for y_i, B, y in iter_spc_slices(spc_file, pars=pars):
+                csv_file = os.path.join(path, y_fmt.format(y_i) + f"{y_unit}_from_2D" + ".csv")
                 header = "Field (mT), Resonance Signal"
-                if not os.path.exists(csv_file):
+                if overwrite or not os.path.exists(csv_file):
                     print(csv_file)
-                    np.savetxt(csv_file, np.vstack((B,y)).T, fmt='%12.4f,\t%14.3f', header=header)
-
-
-        else:
-            print("Cannot interpret 2D scans where second dimension is not angle yet")
-            print("Skipping file")
-            return None
+                    write_columns(csv_file, (B, y), fmt='%12.4f,\t%14.3f', header=header)
+                    written.append(csv_file)
 
     # 1D scan
     else:
+        data = np.fromfile(spc_file, dtype="<f4")
+        B = _field_axis(pars)
         csv_file = f"{spc_file[:-4]}" + ".csv"
         header = "Field (mT), Resonance Signal"
-        if not os.path.exists(csv_file):
+        if overwrite or not os.path.exists(csv_file):
             print(csv_file)
-            np.savetxt(csv_file, np.vstack((B,data)).T, fmt='%12.4f,\t%14.3f', header=header)
+            write_columns(csv_file, (B, data), fmt='%12.4f,\t%14.3f', header=header)
+            written.append(csv_file)
+    return written
+
+
+
+@profiling.profiled("fmr.create_binary")
+def create_binary(spc_file, path=None, silent=True, overwrite=False):
+    """
+    Save the field axis, the signal and all the .par scan parameters to a single binary file,
+    compressed .npz by default or HDF5 for a .h5/.hdf5 path (needs h5py).
+    2D scans are stored as one (y_num, x_res) block with its y axis ("y", in pars.y_unit), and the
+    gonio angles ("angle") for angle-sweeps.
+    Read back with binary_export.load_binary. Returns the file written, empty if it already existed.
+    """
+    from binary_export import save_binary
+    out_file = path if path is not None else f"{spc_file[:-4]}.npz"
+    if os.path.exists(out_file) and not overwrite:
+        return []
+
+    pars = get_scan_params(spc_file, silent=silent)
+    arrays = load_arrays(spc_file, pars)
 
+    if not silent: print(out_file)
+    save_binary(out_file, arrays, vars(pars))
+    return [out_file]
 
 
 
 
 if __name__ in "__main__":
     from glob import glob
-    from print_clr import print_clr
     
     # 1D test files
     file = "../Data/test/test_spc_converter/10.spc"
@@ -81,4 +176,5 @@ if __name__ in "__main__":
         try:
             create_csv(file)
         except Exception as e:
+            from print_clr import print_clr
             print_clr(f"{file} Failed:\n{e}", (255,0,0), end='\n')
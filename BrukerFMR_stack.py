@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Load many FMR .spc/.par files into a single angular dependence dataset.
+
+1D scans (one .spc per gonio angle) and 2D angle-sweeps are combined into one contiguous
+(angle, field) array, sorted by angle, without writing and re-reading intermediate CSV files.
+All files must share the same field axis (field centre, sweep width and number of points).
+
+Usage:
+    from BrukerFMR_stack import load_fmr_stack
+    angles, B, signal = load_fmr_stack("../Data/sample_A/")  # or a glob, or a list of .spc files
+"""
+import os
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from BrukerFMR_par_import import get_scan_params
+from BrukerFMR_spc_par_to_csv import _field_axis, _angles
+
+
+def find_spc_files(source):
+    """
+    The .spc files (with a .par alongside) of `source`: a directory, a glob pattern, a single
+    file or a list of files. Returned sorted.
+    """
+    if isinstance(source, (list, tuple)):
+        paths = list(source)
+    elif os.path.isdir(source):
+        paths = glob(os.path.join(source, "*.spc"))
+    else:
+        paths = glob(source)
+    return sorted(p for p in paths if p.lower().endswith(".spc") and os.path.exists(p[:-4] + ".par"))
+
+
+def _file_angles(spc_file, pars):
+    """The gonio angle of each slice of a 1D scan or 2D angle-sweep, wrapped to [0, 360) as by _angles."""
+    if pars.y_num > 1:
+        if pars.y_scan_type != "angle-sweep":
+            raise ValueError(f"{spc_file}: 2D scan over '{pars.y_scan_type}', not an angle-sweep")
+        return _angles(pars)
+    if pars.gonio is None:
+        raise ValueError(f"{spc_file}: no gonio angle (GAN) in the .par file")
+    return np.array([pars.gonio % 360])
+
+
+def load_fmr_stack(source, workers: int = None, silent: bool = True):
+    """
+    Load 1D scans and 2D angle-sweeps into one array of the signal at each angle and field.
+
+    Parameters
+    ----------
+    source : str or list of str
+        A directory (its .spc files), a glob pattern, or a list of .spc files.
+    workers : int, optional
+        Threads reading the files in parallel, default min(32, cpu count + 4).
+    silent : bool, optional
+        Passed to get_scan_params.
+
+    Returns
+    -------
+    angles : np.ndarray
+        Gonio angle (deg, wrapped to [0, 360)) of each row, ascending.
+    B : np.ndarray
+        The common field axis (mT).
+    signal : np.ndarray
+        float32 array of shape (len(angles), len(B)).
+    """
+    files = find_spc_files(source)
+    if len(files) == 0:
+        raise FileNotFoundError(f"No .spc files with a .par file found in {source}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        all_pars = list(pool.map(lambda f: get_scan_params(f, silent=silent), files))
+
+        # Every file must have the field axis of the first
+        axis = lambda p: (p.field_centre, p.field_sweep_width, p.x_res)
+        for spc_file, pars in zip(files, all_pars):
+            if axis(pars) != axis(all_pars[0]):
+                raise ValueError(f"{spc_file}: field axis (centre, width, points) {axis(pars)} differs from "
+                                 f"{axis(all_pars[0])} of {files[0]}")
+
+        file_angles = [_file_angles(f, p) for f, p in zip(files, all_pars)]
+        assert all(len(a) == p.y_num for a, p in zip(file_angles, all_pars)), "One angle per slice expected"
+        angles = np.concatenate(file_angles)
+        order = np.argsort(angles, kind="stable")
+        rows = np.empty_like(order)
+        rows[order] = np.arange(len(order))  # Destination row of each slice
+
+        # Copy each memory-mapped file straight into its (sorted) rows of the result
+        signal = np.empty((len(angles), all_pars[0].x_res), dtype=np.float32)
+        starts = np.cumsum([0] + [len(a) for a in file_angles])
+
+        def copy(i):
+            pars = all_pars[i]
+            data = np.memmap(files[i], dtype="<f4", mode="r", shape=(pars.y_num, pars.x_res))
+            signal[rows[starts[i]:starts[i+1]]] = data
+
+        list(pool.map(copy, range(len(files))))
+
+    return angles[order], _field_axis(all_pars[0]), signal
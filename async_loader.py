@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio API to load many files concurrently from slow (network) storage.
+
+File contents are fetched in threads, bounded by a semaphore so the share isn't flooded, and then
+parsed in an executor, so the I/O of many files overlaps instead of being serialized.
+
+Usage:
+    raw = await load_raw("scan.raw")
+    pars, signal = await load_fmr("sweep.spc")
+    results = await load_many(paths, limit=32)
+"""
+import os
+import asyncio
+import contextlib
+import functools
+import numpy as np
+from read_Bruker_raw import RawFile
+from BrukerFMR_par_import import scan_params
+
+DEFAULT_LIMIT = 16  # Default number of files read at the same time by load_many
+
+
+def _read_file(path: str, mode: str = "rb"):
+    with open(path, mode) as f:
+        return f.read()
+
+
+async def read_file(path: str, mode: str = "rb", semaphore: asyncio.Semaphore = None):
+    """Read the whole file in a thread, holding `semaphore` (if given) while reading."""
+    async with semaphore or contextlib.nullcontext():
+        return await asyncio.to_thread(_read_file, path, mode)
+
+
+async def load_raw(raw_file_path: str, semaphore: asyncio.Semaphore = None, executor=None, **kwargs):
+    """
+    Asynchronous RawFile(raw_file_path, **kwargs): the file is read in a thread and parsed in
+    `executor` (default: the loop's default executor).
+    """
+    data = await read_file(raw_file_path, "rb", semaphore)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(RawFile, raw_file_path, data=data, **kwargs))
+
+
+def _parse_fmr(text: str, data: bytes):
+    pars = scan_params(text)
+    signal = np.frombuffer(data, dtype="<f4")
+    if pars.y_num > 1:
+        signal = signal.reshape(pars.y_num, pars.x_res)
+    return pars, signal
+
+
+async def load_fmr(spc_path: str, semaphore: asyncio.Semaphore = None, executor=None):
+    """
+    Asynchronously load an .spc/.par pair, both files are read concurrently.
+
+    Returns
+    -------
+    pars : scan_params
+        The parameters of the .par file.
+    signal : np.ndarray
+        The float32 signal (read-only, a view of the file contents), of shape (y_num, x_res) for 2D scans.
+    """
+    base, ext = os.path.splitext(spc_path)
+    base = base if ext.lower() in (".spc", ".par") else spc_path
+    spc_file = spc_path if ext.lower() == ".spc" else base + ".spc"  # Keep the extension's case
+    text, data = await asyncio.gather(read_file(base + ".par", "r", semaphore),
+                                      read_file(spc_file, "rb", semaphore))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, _parse_fmr, text, data)
+
+
+async def load_many(paths, limit: int = DEFAULT_LIMIT, executor=None):
+    """
+    Load .raw and .spc files concurrently, with at most `limit` files being read at a time.
+
+    Returns
+    -------
+    list of the load_raw / load_fmr result of each path, in order, or the exception it raised.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    tasks = [load_raw(p, semaphore, executor) if os.path.splitext(p)[1].lower() == ".raw"
+             else load_fmr(p, semaphore, executor) for p in paths]
+    return await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Batch converter for whole directory trees of Bruker files.
+
+Recursively finds the files of every format registered in readers, .raw (XRR/XRD/RSM) files and
+.spc/.par (FMR) pairs by default, and converts them across a process pool with each reader's
+converter: .raw -> .asc with RawFile.save_asc, .spc -> .csv with create_csv (or both to .npz
+with --format binary). With --format wide, 2D FMR scans are written to a single wide .csv instead
+of one .csv per slice. Failures are reported per file without stopping the batch.
+A conversion manifest at each root (see conversion_manifest) records what was converted, so later
+runs only re-parse sources that changed and rewrite their outputs.
+
+With --profile, the time and bytes of each parse/export stage (see profiling) are collected in the
+workers and a per-stage report of the whole batch printed at the end.
+
+Usage:
+    python batch_convert.py ROOT [ROOT ...] [-j WORKERS] [--format {text,wide,binary}] [--force]
+                            [--no-manifest] [--sniff] [-v] [--profile] [--profile-json FILE]
+"""
+import os
+import sys
+import io
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import profiling
+from conversion_manifest import ConversionManifest, fingerprint, content_hash
+from readers import find_reader, get_reader
+
+
+def discover(roots, sniff: bool = False):
+    """
+    Recursively find the convertible files under each root (a root can also be a single file),
+    of any format registered in readers. With `sniff` the magic bytes of each file are checked too.
+    Returns a sorted list of (kind, path) tuples, kind is the name of the reader (e.g. "raw", "spc").
+    """
+    found = set()
+    for root in roots:
+        if os.path.isfile(root):
+            walk = [(os.path.dirname(root), [], [os.path.basename(root)])]
+        else:
+            walk = os.walk(root)
+        for dir_path, _, file_names in walk:
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                reader = find_reader(path, sniff)
+                if reader is not None:
+                    found.add((reader.kind, path))
+    return sorted(found, key=lambda kp: kp[1])
+
+
+def convert_file(kind: str, path: str, fmt: str = "text", verbose: bool = False, overwrite: bool = False):
+    """
+    Convert a single file with the reader `kind` (run in a worker process).
+    Existing outputs are kept unless `overwrite` is True.
+
+    Returns
+    -------
+    dict with the output files written ("outputs", empty if they all existed) and the source bytes
+    converted ("bytes", 0 if nothing was written).
+    """
+    reader = get_reader(kind)
+    out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with out:
+        outputs = reader.convert(path, fmt, overwrite)
+    n_bytes = sum(os.path.getsize(p) for p in reader.sources(path)) if outputs else 0
+    return {"outputs": outputs, "bytes": n_bytes}
+
+
+def convert_changed(kind: str, path: str, fmt: str = "text", verbose: bool = False, known_hash: str = None):
+    """
+    Manifest-aware conversion (run in a worker process): hash the source and only convert it,
+    rewriting its outputs, if the content differs from `known_hash`.
+
+    Returns
+    -------
+    dict with the source size, mtime_ns and sha256, whether it was converted, the output files
+    written and the bytes read.
+    """
+    size, mtime_ns = fingerprint(kind, path)  # Before reading, so later edits are always seen
+    sha256 = content_hash(kind, path)
+    converted = sha256 != known_hash
+    result = convert_file(kind, path, fmt, verbose, overwrite=True) if converted else {"outputs": [], "bytes": 0}
+    return {"size": size, "mtime_ns": mtime_ns, "sha256": sha256, "converted": converted,
+            "outputs": result["outputs"], "bytes": size + result["bytes"]}
+
+
+def profiled_call(fn, *args):
+    """
+    Call fn(*args) (in a worker process) with a fresh Profiler enabled.
+    Returns the result and the stages of the Profiler as a dict.
+    """
+    previous = profiling.get_profiler()
+    profiler = profiling.enable()
+    try:
+        with profiler.stage("batch.convert"):
+            result = fn(*args)
+    finally:
+        profiling.disable()
+        if previous is not None:
+            profiling.enable(previous)
+    return result, profiler.to_dict()
+
+
+def run_batch(files, workers: int = None, fmt: str = "text", verbose: bool = False,
+              manifest: ConversionManifest = None, force: bool = False, profiler: profiling.Profiler = None):
+    """
+    Convert a list of (kind, path) files across a process pool of `workers` processes
+    (default os.cpu_count(), 1 runs in this process). Failures are printed and collected.
+    With a `manifest`, unchanged sources are skipped and changed ones re-converted, overwriting
+    their outputs. `force` re-converts (and overwrites) every file.
+    With a `profiler`, the stages of every conversion are profiled and merged into it.
+
+    Returns
+    -------
+    dict with the number of files converted/unchanged/failed, bytes read, elapsed time and the failures.
+    """
+    workers = workers or os.cpu_count() or 1
+    options = {"format": fmt}
+    summary = {"converted": 0, "unchanged": 0, "failed": 0, "bytes": 0, "seconds": 0.0, "failures": []}
+    t0 = time.perf_counter()
+
+    tasks = []  # (kind, path, worker function, args)
+    for kind, path in files:
+        if manifest is None:
+            tasks.append((kind, path, convert_file, (kind, path, fmt, verbose, force)))
+        elif not force and manifest.is_current(kind, path, options):
+            summary["unchanged"] += 1  # Not even opened
+        else:
+            entry = None if force else manifest.lookup(path, options)
+            # Missing or modified outputs are rebuilt even if the source content is unchanged
+            intact = entry is not None and manifest.outputs_current(entry)
+            known_hash = entry["sha256"] if intact else None
+            tasks.append((kind, path, convert_changed, (kind, path, fmt, verbose, known_hash)))
+    if profiler is not None:
+        tasks = [(kind, path, profiled_call, (fn, *args)) for kind, path, fn, args in tasks]
+
+    def record(kind, path, fn):
+        try:
+            result = fn()
+        except Exception as e:
+            summary["failed"] += 1
+            summary["failures"].append((path, f"{type(e).__name__}: {e}"))
+            print(f"FAILED {path}\n\t{type(e).__name__}: {e}", file=sys.stderr)
+            return
+        if profiler is not None:
+            result, stages = result
+            profiler.merge(stages)
+        if "sha256" in result:  # convert_changed
+            manifest.record(kind, path, result["size"], result["mtime_ns"], result["sha256"], options,
+                            result["outputs"] if result["converted"] else None)
+            summary["converted" if result["converted"] else "unchanged"] += 1
+        else:  # convert_file, unchanged if every output already existed
+            summary["converted" if result["outputs"] else "unchanged"] += 1
+        summary["bytes"] += result["bytes"]
+
+    try:
+        if workers == 1:
+            for kind, path, fn, args in tasks:
+                record(kind, path, lambda: fn(*args))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(fn, *args): (kind, path) for kind, path, fn, args in tasks}
+                for future in as_completed(futures):
+                    record(*futures[future], future.result)
+    finally:
+        if manifest is not None:
+            manifest.save()  # Keep the progress even if interrupted
+
+    summary["seconds"] = time.perf_counter() - t0
+    return summary
+
+
+def print_summary(summary: dict):
+    """Print the throughput summary of a run_batch result."""
+    secs = max(summary["seconds"], 1e-9)
+    n = summary["converted"] + summary["unchanged"] + summary["failed"]
+    print(f"{summary['converted']} converted, {summary['unchanged']} unchanged, {summary['failed']} failed"
+          f" in {summary['seconds']:.2f} s"
+          f" ({n/secs:.1f} files/s, {summary['bytes']/1e6/secs:.2f} MB/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Bruker .raw and .spc/.par files in directory trees.")
+    parser.add_argument("roots", nargs="+", help="Directories (searched recursively) or files to convert")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--format", choices=["text", "wide", "binary"], default="text",
+                        help="text: .asc/.csv (default), wide: as text with one .csv per 2D FMR scan, binary: .npz")
+    parser.add_argument("--force", action="store_true", help="Re-convert every file, overwriting outputs")
+    parser.add_argument("--no-manifest", action="store_true",
+                        help="Don't read/write the conversion manifest, only skip files whose output exists")
+    parser.add_argument("--sniff", action="store_true",
+                        help="Also check the magic bytes of each file found, skipping files of another format")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the output of each conversion")
+    parser.add_argument("--profile", action="store_true", help="Print the time and bytes of each parse/export stage")
+    parser.add_argument("--profile-json", metavar="FILE", help="Also write the stage profile to this JSON file")
+    args = parser.parse_args(argv)
+    profiler = profiling.Profiler() if (args.profile or args.profile_json) else None
+
+    total = {"converted": 0, "unchanged": 0, "failed": 0, "bytes": 0, "seconds": 0.0, "failures": []}
+    for root in args.roots:
+        files = discover([root], args.sniff)
+        print(f"Found {len(files)} files to convert in {root}")
+        manifest = None if args.no_manifest else ConversionManifest(root)
+        summary = run_batch(files, args.workers, args.format, args.verbose, manifest, args.force, profiler)
+        for key in total:
+            total[key] += summary[key]
+    print_summary(total)
+    if profiler is not None:
+        print(profiler.report())
+        if args.profile_json:
+            profiler.to_json(args.profile_json)
+    return 1 if total["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
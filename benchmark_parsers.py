@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the parsers and exporters on synthetic files, so performance changes are measurable
+without access to real measurement data.
+
+write_raw4 synthesizes valid Bruker RAW4 files (header, global segments of type 5/10/30/60 and
+n_ranges Locked Coupled ranges with drive segments), and write_spc_par synthesizes 1D and 2D
+(angle-sweep) .spc/.par pairs. Each stage is timed (best of --repeat) and its peak traced memory
+reported.
+
+Usage:
+    python benchmark_parsers.py [--raw RANGESxSTEPS ...] [--fmr YxX ...] [--repeat N] [--no-memory]
+                                [--json FILE]
+"""
+import os
+import io
+import sys
+import json
+import time
+import struct
+import random
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+
+def write_raw4(path: str, n_ranges: int = 1, steps: int = 1000, seed: int = 0):
+    """Write a synthetic RAW4 file of n_ranges Locked Coupled ranges (an RSM if n_ranges > 1)."""
+    rnd = random.Random(seed)
+    b = bytearray(struct.pack("<4s8x12s10s27x", b"RAW4.00", b"10/19/2025", b"18:40:31"))
+    # Global metadata segments: 10 (var info), 30 (hardware), 5 (HRXRD alignment), 60 (drives)
+    for tag, value in [(b"SAMPLEID", b"synthetic"), (b"USER", b"benchmark")]:
+        b += struct.pack("<II4x24s", 10, 36 + len(value), tag) + value
+    b += struct.pack("<II64x5d4x4s", 30, 120, 1.5418, 1.5406, 1.5444, 1.3922, 0.5, b"Cu")
+    b += struct.pack("<II8x12s12s40x12s12s8x", 5, 112, b"0 0 1", b"1 0 0", b"0 0 1", b"1 0 0")
+    for i, name in enumerate([b"Theta", b"2Theta", b"Chi"]):
+        b += struct.pack("<III24s32xd", 60, 76, 1, name, 0.001 * i)
+
+    for r in range(n_ranges):
+        drives = b""
+        for name, value in [(b"Theta", 10.0 + 0.01*r), (b"2Theta", 20.0), (b"Phi", 0.0), (b"Tube", 0.0)]:
+            drives += struct.pack("<II4x24s20xd", 50, 64, name, value)
+        b += struct.pack("<I28x24s16x2dIf4x2f4xd16x2I16x", 0 if r == 0 else 160, b"Locked Coupled",
+                         20.0 + 0.01*r, 0.01, steps, 0.5, 40.0, 40.0, 1.5406, 4, len(drives))
+        b += drives
+        b += struct.pack(f"<{steps}f", *[float(rnd.randint(0, 10**5)) for _ in range(steps)])
+
+    with open(path, "wb") as f:
+        f.write(b)
+
+
+def write_spc_par(path: str, x_res: int = 1024, y_num: int = 1, seed: int = 0):
+    """Write a synthetic .spc/.par pair, 1D or (if y_num > 1) a 2D angle-sweep. `path` has no extension."""
+    rnd = random.Random(seed)
+    lines = ["DOS  Format", f"ANZ {x_res*y_num}", "MIN -1.000000e+00", "MAX 1.000000e+00",
+             "JSS 2", "JON benchmark", "JDA 16/Apr/2024", "JTM 00:06", "JRE none", "JEX field-sweep",
+             "HCF 3480.000000", "HSW 6000.000000", "RCT 40.960", "RTC 10.240", "RRG 1.00e+04",
+             "RMA 1.000", "MF 9.400000", "MP 2.000e+01", "MPD 10", "GAN 0.0", "GANS 5.0"]
+    if y_num > 1:
+        lines += [f"SSX {x_res}", f"SSY {y_num}", "XXLB 480.0", "XXWI 6000.0", "XYLB 0.0",
+                  f"XYWI {5.0*(y_num-1)}", "XXUN G", "XYUN deg", "JEY angle-sweep"]
+    with open(path + ".par", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    with open(path + ".spc", "wb") as f:
+        f.write(struct.pack(f"<{x_res*y_num}f", *[rnd.gauss(0, 1) for _ in range(x_res*y_num)]))
+
+
+def measure(fn, repeat: int = 3, memory: bool = True):
+    """
+    Best wall time (s) of `repeat` calls of fn, and the peak traced memory (bytes) of one more
+    call (None if not `memory`, tracing slows down allocation heavy stages considerably).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    if not memory:
+        return best, None
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(raw_sizes, fmr_sizes, repeat: int = 3, memory: bool = True):
+    """Benchmark every stage on synthetic files of each size, returns a list of result dicts."""
+    from read_Bruker_raw import RawFile
+    from BrukerFMR_par_import import get_scan_params
+    from BrukerFMR_spc_par_to_csv import create_csv
+
+    results = []
+    quiet = lambda: contextlib.redirect_stdout(io.StringIO())
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_ranges, steps in raw_sizes:
+            path = os.path.join(tmp, f"rsm_{n_ranges}x{steps}.raw")
+            write_raw4(path, n_ranges, steps)
+            raw = RawFile(path)
+
+            def save_asc():
+                with quiet():
+                    RawFile(path).save_asc("deg", "counts", overwrite=True)
+
+            stages = [("RawFile", lambda: RawFile(path)),
+                      ("RawFile(lazy)", lambda: RawFile(path, lazy=True)),
+                      ("RawFile(python)", lambda: RawFile(path, use_numpy=False)),
+                      ("get_data", lambda: (raw.data_cache.clear(), raw.get_data())),
+                      ("RawFile+save_asc", save_asc)]
+            for stage, fn in stages:
+                secs, peak = measure(fn, repeat, memory)
+                results.append({"stage": stage, "size": f"{n_ranges}x{steps}",
+                                "bytes": os.path.getsize(path), "seconds": secs, "peak_bytes": peak})
+
+        for y_num, x_res in fmr_sizes:
+            base = os.path.join(tmp, f"fmr_{y_num}x{x_res}")
+            write_spc_par(base, x_res, y_num)
+
+            def convert():
+                with quiet():
+                    create_csv(base + ".spc", overwrite=True)
+
+            for stage, fn in [("get_scan_params", lambda: get_scan_params(base)), ("create_csv", convert)]:
+                secs, peak = measure(fn, repeat, memory)
+                results.append({"stage": stage, "size": f"{y_num}x{x_res}",
+                                "bytes": os.path.getsize(base + ".spc"), "seconds": secs, "peak_bytes": peak})
+    return results
+
+
+def _size(text: str):
+    a, _, b = text.lower().partition("x")
+    return int(a), int(b)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Bruker parsers on synthetic files.")
+    parser.add_argument("--raw", nargs="*", type=_size, default=[(1, 5000), (50, 1000), (200, 2000)],
+                        metavar="RANGESxSTEPS", help="RAW4 sizes (default: 1x5000 50x1000 200x2000)")
+    parser.add_argument("--fmr", nargs="*", type=_size, default=[(1, 4096), (72, 2048)],
+                        metavar="YxX", help="FMR sizes, slices x field points (default: 1x4096 72x2048)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repeats, best is reported (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="Don't trace the peak memory (faster)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.raw, args.fmr, args.repeat, not args.no_memory)
+    print(f"{'stage':<18}{'size':>12}{'file MB':>10}{'time (ms)':>12}{'peak MB':>10}")
+    for r in results:
+        peak = "-" if r["peak_bytes"] is None else f"{r['peak_bytes']/1e6:.2f}"
+        print(f"{r['stage']:<18}{r['size']:>12}{r['bytes']/1e6:>10.2f}{r['seconds']*1e3:>12.2f}{peak:>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
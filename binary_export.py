@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Binary export of parsed measurement data, used by RawFile.save_binary and create_binary.
+
+The data arrays and the parsed metadata are stored together in a single file, either a compressed
+numpy .npz archive or, when h5py is installed, an HDF5 file (.h5/.hdf5). Both are read back with
+load_binary, which is much faster than re-parsing the text exports with np.loadtxt.
+numpy is imported by save_binary and load_binary, so json_default is usable without it.
+"""
+import json
+
+META_KEY = "__meta__"  # Name of the JSON metadata entry in the .npz / HDF5 attribute
+HDF5_EXTENSIONS = (".h5", ".hdf5")
+
+
+def json_default(obj):
+    """json.dumps default hook, converts numpy arrays/scalars to python lists/floats."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def save_binary(path: str, arrays: dict, meta: dict):
+    """
+    Save data arrays and their metadata to a single binary file.
+
+    Parameters
+    ----------
+    path : str
+        Output path, the format is chosen by extension: .h5/.hdf5 for HDF5, otherwise .npz.
+    arrays : dict
+        Name -> array-like data, stored with their own dtype and shape.
+    meta : dict
+        JSON serialisable metadata (e.g. RawFile.meta or vars(scan_params)).
+    """
+    import numpy as np
+    meta_json = json.dumps(meta, default=json_default)
+    if path.lower().endswith(HDF5_EXTENSIONS):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("h5py is required to export to HDF5, use a .npz path instead")
+        with h5py.File(path, "w") as f:
+            for name, data in arrays.items():
+                f.create_dataset(name, data=np.asarray(data), compression="gzip")
+            f.attrs[META_KEY] = meta_json
+    else:
+        assert META_KEY not in arrays, f"'{META_KEY}' is reserved for the metadata"
+        np.savez_compressed(path, **{k: np.asarray(v) for k, v in arrays.items()},
+                            **{META_KEY: np.array(meta_json)})
+
+
+def load_binary(path: str):
+    """
+    Load a file written by save_binary.
+
+    Returns
+    -------
+    arrays : dict
+        Name -> numpy array.
+    meta : dict
+        The metadata stored with the arrays.
+    """
+    import numpy as np
+    if path.lower().endswith(HDF5_EXTENSIONS):
+        import h5py
+        with h5py.File(path, "r") as f:
+            arrays = {name: f[name][()] for name in f.keys()}
+            meta = json.loads(f.attrs[META_KEY])
+    else:
+        with np.load(path, allow_pickle=False) as f:
+            arrays = {name: f[name] for name in f.files if name != META_KEY}
+            meta = json.loads(f[META_KEY][()])
+    return arrays, meta
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental conversion manifest, used by batch_convert to only re-parse sources that changed.
+
+A JSON-lines file (.convert_manifest.jsonl) at the root of each converted tree records, for each
+source, its size, mtime and SHA-256 content hash, the export options used and the mtime of each
+output file written. A source is skipped without being read when size, mtime and options are
+unchanged and all its outputs still exist unmodified. If only the mtime changed (e.g. the file was
+copied) the content hash decides, so re-measured files that overwrote an older file are always
+re-converted and their outputs rewritten. Missing or modified outputs are always rebuilt.
+"""
+import os
+import json
+import hashlib
+from readers import get_reader
+
+MANIFEST_NAME = ".convert_manifest.jsonl"
+
+
+def source_files(kind: str, path: str):
+    """All the files a conversion reads: the file and its companions (e.g. the .par of an .spc)."""
+    return get_reader(kind).sources(path)
+
+
+def fingerprint(kind: str, path: str):
+    """(total size, latest mtime in ns) of the source files, from os.stat only."""
+    stats = [os.stat(p) for p in source_files(kind, path)]
+    return sum(st.st_size for st in stats), max(st.st_mtime_ns for st in stats)
+
+
+def content_hash(kind: str, path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 hex digest of the source files' contents."""
+    h = hashlib.sha256()
+    for p in source_files(kind, path):
+        with open(p, "rb") as f:
+            while chunk := f.read(chunk_size):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class ConversionManifest:
+    """Manifest of converted sources under `root`, stored in `root`/.convert_manifest.jsonl."""
+    def __init__(self, root: str):
+        self.root = root if os.path.isdir(root) else os.path.dirname(root) or "."
+        self.path = os.path.join(self.root, MANIFEST_NAME)
+        self.entries = dict()  # relative source path -> entry dict
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["path"]] = entry  # Later lines take precedence
+
+    def __key(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace("\\", "/")
+
+    def lookup(self, path: str, options: dict):
+        """The entry for `path` if it was converted with the same options, otherwise None."""
+        entry = self.entries.get(self.__key(path))
+        if entry is None or entry["options"] != options:
+            return None
+        return entry
+
+    def outputs_current(self, entry: dict) -> bool:
+        """True if every output recorded in the entry exists with its recorded mtime."""
+        if not entry.get("outputs"):
+            return False  # Nothing recorded (e.g. an older manifest), rebuild to record them
+        try:
+            return all(os.stat(os.path.join(self.root, key)).st_mtime_ns == mtime_ns
+                       for key, mtime_ns in entry["outputs"].items())
+        except OSError:
+            return False
+
+    def is_current(self, kind: str, path: str, options: dict) -> bool:
+        """
+        True if the source is unchanged (size and mtime) since it was converted with `options`,
+        and its outputs weren't deleted or modified since.
+        """
+        entry = self.lookup(path, options)
+        if entry is None:
+            return False
+        try:
+            size, mtime_ns = fingerprint(kind, path)
+        except OSError:
+            return False
+        return entry["size"] == size and entry["mtime_ns"] == mtime_ns and self.outputs_current(entry)
+
+    def record(self, kind: str, path: str, size: int, mtime_ns: int, sha256: str, options: dict,
+               outputs=None):
+        """
+        Record a (re-)converted or verified source. `outputs` are the files written by the
+        conversion, None keeps the outputs recorded before (the source was verified unchanged).
+        """
+        key = self.__key(path)
+        if outputs is None:
+            recorded = self.entries.get(key, {}).get("outputs", {})
+        else:
+            recorded = {self.__key(p): os.stat(p).st_mtime_ns for p in outputs}
+        self.entries[key] = {"path": key, "kind": kind, "size": size, "mtime_ns": mtime_ns,
+                             "sha256": sha256, "options": options, "outputs": recorded}
+
+    def save(self):
+        """Write the manifest (sorted by path) atomically, replacing the previous file."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for key in sorted(self.entries):
+                f.write(json.dumps(self.entries[key], sort_keys=True) + "\n")
+        os.replace(tmp_path, self.path)
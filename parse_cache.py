@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+In-process LRU cache of parsed files, for notebooks and services that open the same files repeatedly.
+
+Parsed RawFile and scan_params objects are returned from the cache while the file's path, size and
+mtime are unchanged. The cache is bounded by entry count and by the total bytes of the parsed
+arrays, evicting the least recently used entries. Sizes are re-estimated on every access, as a
+cached object grows when used (lazy ranges loading their counts, RawFile.data_cache filling). With
+a cache_dir, parsed objects are also pickled to disk so a restarted process warms up without
+re-parsing.
+
+Usage:
+    from parse_cache import cached_raw_file, cached_scan_params
+    raw = cached_raw_file("scan.raw")
+"""
+import os
+import sys
+import pickle
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+
+def _nbytes(values) -> int:
+    """Approximate memory of an array or list of floats."""
+    if values is None:
+        return 0
+    if hasattr(values, "nbytes"):
+        return values.nbytes
+    if isinstance(values, array):
+        return values.itemsize * len(values)
+    return sys.getsizeof(values) + 24 * len(values)  # list + python float objects
+
+
+def estimate_size(obj) -> int:
+    """Approximate memory (bytes) of a parsed object, dominated by its data arrays."""
+    if hasattr(obj, "ranges"):  # RawFile
+        size = sum(_nbytes(r.counts) for r in obj.ranges)  # float32 counts, .I isn't kept
+        size += sum(_nbytes(a) for data in obj.data_cache.values() for a in data)
+        return size + 4096
+    return 4096 + sum(len(k) + len(v) for k, v in getattr(obj, "params", {}).items())
+
+
+class ParseCache:
+    """
+    LRU cache of parsed files, keyed by (kind, absolute path, parse options) and validated against
+    the file's size and mtime.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Maximum number of cached files, default 64.
+    max_bytes : int, optional
+        Maximum total (estimated) bytes of the cached arrays, default 1 GB.
+    cache_dir : str, optional
+        Directory to persist parsed objects to (pickle), default None (memory only).
+    """
+    def __init__(self, max_entries: int = 64, max_bytes: int = 10**9, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.entries = OrderedDict()  # key -> (fingerprint, object, size)
+        self.total_bytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.RLock()
+
+    def get_raw(self, raw_file_path: str, **kwargs):
+        """Parsed RawFile(raw_file_path, **kwargs), from the cache if the file is unchanged."""
+        from read_Bruker_raw import RawFile
+        return self.get("raw", raw_file_path, lambda: RawFile(raw_file_path, **kwargs), kwargs)
+
+    def get_scan_params(self, file_name: str):
+        """Parsed get_scan_params(file_name) of a .par (or .spc) file, from the cache if unchanged."""
+        from BrukerFMR_par_import import get_scan_params
+        base, ext = os.path.splitext(file_name)
+        par_file = (base if ext.lower() in (".spc", ".par") else file_name) + ".par"
+        return self.get("par", par_file, lambda: get_scan_params(par_file))
+
+    def get(self, kind: str, path: str, parse, options: dict = None):
+        """
+        Return the cached object of `path`, calling `parse()` (and caching the result) if it is
+        not cached, or the file changed since.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        fingerprint = (st.st_size, st.st_mtime_ns)
+        key = (kind, path, tuple(sorted((options or {}).items())))
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.__refresh_sizes()
+                self.__evict()
+                return entry[1]
+            if entry is not None:  # Stale, file changed
+                self.__remove(key)
+
+        obj = self.__load(key, fingerprint)
+        if obj is None:
+            obj = parse()
+            self.__save(key, fingerprint, obj)
+        with self.lock:
+            self.misses += 1
+            self.__insert(key, fingerprint, obj)
+        return obj
+
+    def clear(self):
+        """Empty the in-memory cache (the on-disk cache is kept)."""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    # Private methods (preceded by "__"), call with the lock held
+    def __insert(self, key, fingerprint, obj):
+        if key in self.entries:
+            self.__remove(key)
+        size = estimate_size(obj)
+        self.entries[key] = (fingerprint, obj, size)
+        self.total_bytes += size
+        self.__refresh_sizes()
+        self.__evict()
+
+    def __refresh_sizes(self):
+        """Re-estimate the size of every entry, objects grow after being cached (get_data, lazy loading)."""
+        for key, (fingerprint, obj, _) in self.entries.items():
+            self.entries[key] = (fingerprint, obj, estimate_size(obj))
+        self.total_bytes = sum(entry[2] for entry in self.entries.values())
+
+    def __evict(self):
+        """Evict the least recently used entries while over a limit, always keeping the newest entry."""
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self.__remove(next(iter(self.entries)))
+
+    def __remove(self, key):
+        self.total_bytes -= self.entries.pop(key)[2]
+
+    # On-disk persistence, one pickle per key holding (fingerprint, object)
+    def __disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + ".pkl")
+
+    def __load(self, key, fingerprint):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.__disk_path(key), "rb") as f:
+                stored_fingerprint, obj = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        return obj if stored_fingerprint == fingerprint else None
+
+    def __save(self, key, fingerprint, obj):
+        if self.cache_dir is None:
+            return
+        path = self.__disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((fingerprint, obj), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+# Shared cache of the process
+default_cache = ParseCache()
+
+
+def cached_raw_file(raw_file_path: str, **kwargs):
+    """RawFile(raw_file_path, **kwargs), from the shared cache while the file is unchanged."""
+    return default_cache.get_raw(raw_file_path, **kwargs)
+
+
+def cached_scan_params(file_name: str):
+    """get_scan_params(file_name), from the shared cache while the .par file is unchanged."""
+    return default_cache.get_scan_params(file_name)
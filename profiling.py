@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in timing and byte counting of the parse and export stages.
+
+The parsers and exporters wrap their stages in `stage(name, nbytes)` (or decorate them with
+`profiled(name)`), which does nothing unless a Profiler has been enabled. Stage times are inclusive
+of any nested stages. An enabled Profiler accumulates the calls, wall time and bytes of each
+stage, can be merged with the profiles of other processes (e.g. the batch converter's workers) and
+exported as JSON.
+
+Usage:
+    profiler = profiling.enable()
+    RawFile("scan.raw").save_asc()
+    print(profiler.report())
+"""
+import json
+import time
+import functools
+from contextlib import contextmanager
+
+
+class Profiler:
+    """Accumulated calls, seconds and bytes of each named stage."""
+    def __init__(self):
+        self.stages = dict()  # name -> {"calls": int, "seconds": float, "bytes": int}
+
+    def __entry(self, name: str) -> dict:
+        if name not in self.stages:
+            self.stages[name] = {"calls": 0, "seconds": 0.0, "bytes": 0}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str, nbytes: int = 0):
+        """Time the block as one call of stage `name`, which processed `nbytes` bytes."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.__entry(name)
+            entry["calls"] += 1
+            entry["seconds"] += time.perf_counter() - t0
+            entry["bytes"] += nbytes
+
+    def add_bytes(self, name: str, nbytes: int):
+        """Count bytes for a stage, e.g. once they are known at the end of the stage."""
+        self.__entry(name)["bytes"] += nbytes
+
+    def merge(self, other):
+        """Add the stages of another Profiler (or its to_dict()) to this one."""
+        stages = other.stages if isinstance(other, Profiler) else other
+        for name, values in stages.items():
+            entry = self.__entry(name)
+            for key in entry:
+                entry[key] += values[key]
+        return self
+
+    def to_dict(self) -> dict:
+        return {name: dict(values) for name, values in self.stages.items()}
+
+    def to_json(self, path: str = None) -> str:
+        """The stages as JSON, also written to `path` if given."""
+        text = json.dumps(self.to_dict(), indent=4)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def report(self) -> str:
+        """A table of the stages, slowest first."""
+        lines = [f"{'stage':<28}{'calls':>8}{'total (s)':>12}{'mean (ms)':>12}{'MB':>10}{'MB/s':>10}"]
+        for name, e in sorted(self.stages.items(), key=lambda kv: -kv[1]["seconds"]):
+            mean_ms = 1e3 * e["seconds"] / max(e["calls"], 1)
+            rate = e["bytes"] / 1e6 / e["seconds"] if e["seconds"] > 0 else 0.0
+            lines.append(f"{name:<28}{e['calls']:>8}{e['seconds']:>12.3f}{mean_ms:>12.3f}{e['bytes']/1e6:>10.2f}{rate:>10.1f}")
+        return "\n".join(lines)
+
+
+_active = None  # The enabled Profiler, if any
+
+
+def enable(profiler: Profiler = None) -> Profiler:
+    """Start profiling the stages into `profiler` (default a new Profiler), which is returned."""
+    global _active
+    _active = profiler if profiler is not None else Profiler()
+    return _active
+
+
+def disable() -> Profiler:
+    """Stop profiling, returning the Profiler that was enabled (or None)."""
+    global _active
+    profiler, _active = _active, None
+    return profiler
+
+
+def get_profiler() -> Profiler:
+    """The enabled Profiler, or None."""
+    return _active
+
+
+@contextmanager
+def stage(name: str, nbytes: int = 0):
+    """Time the block in the enabled Profiler, if any."""
+    if _active is None:
+        yield
+    else:
+        with _active.stage(name, nbytes):
+            yield
+
+
+def add_bytes(name: str, nbytes: int):
+    """Count bytes for a stage in the enabled Profiler, if any."""
+    if _active is not None:
+        _active.add_bytes(name, nbytes)
+
+
+def profiled(name: str):
+    """Decorator timing every call of the function as stage `name` in the enabled Profiler, if any."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return fn(*args, **kwargs)
+            with _active.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
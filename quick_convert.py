@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Fast-starting converter for the right-click (.bat) workflow, for any format registered in readers.
+
+Only the standard library is imported at startup, the parser (and numpy) of a format are imported
+when a file of that format is converted. Optionally a persistent converter daemon is kept running
+(--serve), with the parsers and numpy already imported: later invocations hand their paths to the
+daemon over a Unix socket and return as soon as it is done, skipping the parser and numpy
+startup. The socket lives in a directory only the user can access (mode 0700, owned by them), and
+the launcher only hands paths to a socket owned by the user. Without a running daemon (or on
+Windows, without Unix sockets), files are converted in this process.
+
+Usage:
+    python quick_convert.py FILE [FILE ...] [--binary | --wide] [--overwrite] [--no-daemon]
+    python quick_convert.py --serve  # start the daemon, stop with Ctrl+C
+
+Point the .bat file of read_Bruker_raw.py at this script to use it from the context menu.
+"""
+import os
+import sys
+import stat
+import json
+import socket
+
+
+def socket_dir(create: bool = False) -> str:
+    """
+    The per-user directory of the daemon socket, in XDG_RUNTIME_DIR or else /tmp, created with mode
+    0700 if `create`. Raises PermissionError if it isn't a directory owned by and private to the
+    user (e.g. pre-created by someone else in /tmp).
+    """
+    path = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or "/tmp", f"bruker_convert-{os.getuid()}")
+    if create:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a private directory of this user")
+    return path
+
+
+def socket_path(create: bool = False) -> str:
+    """Path of the daemon socket, see socket_dir."""
+    return os.path.join(socket_dir(create), "convert.sock")
+
+
+def convert_paths(paths, fmt: str = "text", overwrite: bool = False):
+    """
+    Convert each file with its registered reader, in this process.
+    Returns the failures as a list of (path, error message).
+    """
+    from readers import find_reader
+    failures = []
+    for path in paths:
+        if not os.path.exists(path):
+            failures.append((path, "File does not exist"))
+            continue
+        reader = find_reader(path)
+        if reader is None:
+            failures.append((path, "Not a supported file"))
+            continue
+        try:
+            reader.convert(path, fmt, overwrite)
+        except Exception as e:
+            failures.append((path, f"{type(e).__name__}: {e}"))
+    return failures
+
+
+def send_to_daemon(paths, fmt: str = "text", overwrite: bool = False, path: str = None):
+    """
+    Hand the paths to the running daemon (on the socket `path`, default socket_path()) and wait
+    for it to convert them. Returns the daemon's response (dict of "output" and "failures"), or
+    None if no daemon of this user is running.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    request = {"paths": [os.path.abspath(p) for p in paths], "format": fmt, "overwrite": overwrite}
+    try:
+        path = path if path is not None else socket_path()
+        st = os.lstat(path)
+        if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+            return None  # Not our daemon, never hand it any paths
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+            s.sendall(json.dumps(request).encode() + b"\n")
+            with s.makefile("rb") as f:
+                return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None  # Stale socket or daemon gone, convert in process
+
+
+def serve(path: str = None):
+    """
+    Run the converter daemon on the Unix socket `path` (default socket_path(), creating its private
+    directory), handling one request at a time until interrupted.
+    """
+    import io
+    import contextlib
+    import socketserver
+    import signal
+    # Import the parsers (and numpy) now, so requests don't pay for it
+    import read_Bruker_raw, BrukerFMR_spc_par_to_csv  # noqa: F401
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                failures = convert_paths(request["paths"], request.get("format", "text"),
+                                         request.get("overwrite", False))
+            self.wfile.write(json.dumps({"output": out.getvalue(), "failures": failures}).encode() + b"\n")
+
+    path = path if path is not None else socket_path(create=True)
+    if os.path.lexists(path):
+        if send_to_daemon([], path=path) is not None:
+            print(f"A daemon is already running on {path}")
+            return 1
+        os.remove(path)  # Stale socket of a daemon that didn't exit cleanly
+
+    umask = os.umask(0o177)  # Socket created as 0600, only this user can hand over files
+    try:
+        server = socketserver.UnixStreamServer(path, Handler)
+    finally:
+        os.umask(umask)
+    with server:
+        print(f"Converting files handed over on {path}, Ctrl+C to stop")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # Also remove the socket when killed
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
+    return 0
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    flags = {a for a in args if a.startswith("--")}
+    paths = [a for a in args if not a.startswith("--")]
+
+    if "--serve" in flags:
+        if not hasattr(socket, "AF_UNIX"):
+            print("The daemon needs Unix sockets, which this platform doesn't support")
+            return 1
+        try:
+            return serve()
+        except PermissionError as e:
+            print(e)
+            return 1
+
+    if len(paths) == 0:
+        print("No argument passed")
+        return 1
+    fmt = "binary" if "--binary" in flags else "wide" if "--wide" in flags else "text"
+    overwrite = "--overwrite" in flags
+
+    response = None if "--no-daemon" in flags else send_to_daemon(paths, fmt, overwrite)
+    if response is not None:
+        print(response["output"], end="")
+        failures = response["failures"]
+    else:
+        failures = convert_paths(paths, fmt, overwrite)
+
+    for path, error in failures:
+        print(f"FAILED {path}\n\t{error}")
+    print("---------- Done! ----------")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
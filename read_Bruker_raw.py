@@ -8,44 +8,189 @@ Used for XRR, XRD and RSM measurements from a Bruker D8 Discover tool.
 The format of the binary file was interpreted from wojdyr/xylib/Bruker_raw.cpp,
 and this file is licensed under GNU Lesser General Public License v2.1 accoridngly.
 """
+import os
+import io
+import mmap
 import struct
 import json
+from array import array
 from math import cos, sin
+import profiling
+
+# Precompiled little-endian layouts of the RAW4 header blocks, decoded with unpack_from.
+# Segment layouts start after the 8 byte (type, length) segment header.
+_FILE_HEADER = struct.Struct("<4s8x12s10s27x")  # version, date, time. 61 bytes
+_SEGMENT_HEADER = struct.Struct("<II")  # type, length (including these 8 bytes)
+_SEG_ALIGNMENT = struct.Struct("<8x12s12s40x12s12s")  # type 5: substrate and sample vectors
+_SEG_VAR_INFO = struct.Struct("<4x24s")  # type 10: tag name, followed by the value string
+_SEG_HARDWARE = struct.Struct("<64x5d4x4s")  # type 30: alpha avg/1/2, beta, ratio, anode
+_SEG_DRIVE_ALIGN = struct.Struct("<I24s32xd")  # type 60: align flag, name, delta
+_SEG_DRIVE_NAME = struct.Struct("<4x24s")  # type 50 (range drive): name, value at +56
+_SEG_DRIVE_VALUE = struct.Struct("<48xd")
+# Range header after its 4 byte type: scan type, start, step, steps, time per step,
+# generator voltage and current, lambda, datum size, extra header size. 156 bytes
+_RANGE_HEADER = struct.Struct("<28x24s16x2dIf4x2f4xd16x2I16x")
+
+# Drives of the range header (type 50 segments) to store in the range meta
+_RANGE_DRIVES = ["Theta", "2Theta", "Divergence Slit", "Antiscattering Slit", "Phi", "Chi", "X-Drive", "Y-Drive", "Z-Drive"]
+
+
+def _decode_string(data: bytes) -> str:
+    """Decode a fixed-length, null padded string field."""
+    return data.strip(b'\x00').decode('utf-8', errors='ignore')
+
+
+def _import_numpy():
+    """Return the numpy module, or None if it is not installed (pure python fallback)."""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
 
 class DataRange:
+    """
+    A single data range (scan) of a raw file. The 2Theta values (tt) are stored implicitly by the
+    START_ANGLE, STEP_SIZE and STEPS meta and the intensities as the float32 counts of the file
+    (a numpy array, or array('f') without numpy), 4 bytes per point. Both .tt and .I are computed
+    on every access and not kept, so keep a reference to them rather than indexing them repeatedly.
+    RawFile.get_data caches its (float64) results, use it for repeated access to whole scans.
+    """
+    __slots__ = ("meta", "counts", "raw_file", "data_offset", "use_numpy")
+
     def __init__(self):
         self.meta = dict()
-        self.tt = None
-        self.I = None
-        
-    def calculate_x(self):
+        self.counts = None  # Counts of each step, float32 as stored in the file
+        # Byte-offset index of the intensity block, so the counts can be read on first access (lazy)
+        self.raw_file = None
+        self.data_offset = None
+        self.use_numpy = False
+
+    @property
+    def has_data(self) -> bool:
+        """False for ranges of unknown scan type, that were skipped."""
+        return self.counts is not None or self.data_offset is not None
+
+    @property
+    def tt(self):
+        """2Theta (deg) of each step, rounded to 4 decimals. None if the range has no data."""
+        return self.calculate_x(self.use_numpy) if self.has_data else None
+
+    @property
+    def I(self):
+        """
+        Intensity (CPS) of each step, float64, computed from the counts on every access (not
+        cached). The counts are read from the raw file first if loaded lazily.
+        """
+        if self.counts is None:
+            if self.data_offset is None:
+                return None
+            self.load_intensity()
+        dwell = self.meta["TIME_PER_STEP"]
+        if self.use_numpy:
+            np = _import_numpy()
+            return np.divide(self.counts, dwell, dtype=np.float64)
+        return [c / dwell for c in self.counts]
+
+    def calculate_x(self, use_numpy: bool = False):
+        """Compute the 2Theta values from the start angle, step size and number of steps."""
         try:
             start = self.meta['START_ANGLE']
             step = self.meta['STEP_SIZE']
-            self.tt = [round(start+i*step, 4) for i in range(self.meta['STEPS'])]
+            steps = self.meta['STEPS']
         except:
             raise KeyError("Start, step size and/or steps meta info not this data range!")
+        if use_numpy:
+            np = _import_numpy()
+            return np.round(start + step*np.arange(steps), 4)
+        return [round(start+i*step, 4) for i in range(steps)]
+
+    def read_intensity(self, buffer, offset: int = 0, copy: bool = True):
+        """
+        Store the counts of the intensity block starting at byte `offset` of `buffer` (bytes, or
+        an mmap of the file). With numpy the float32 counts are read with np.frombuffer, and only
+        copied (out of the buffer) if `copy`.
+        """
+        steps = self.meta['STEPS']
+        if self.use_numpy:
+            np = _import_numpy()
+            counts = np.frombuffer(buffer, dtype="<f4", count=steps, offset=offset)
+            self.counts = counts.copy() if copy else counts
+        else:
+            self.counts = array("f", struct.unpack_from(f"<{steps}f", buffer, offset))
+
+    @profiling.profiled("raw.load_intensity")
+    def load_intensity(self):
+        """Read the intensity block at the indexed byte offset of the raw file (single read)."""
+        n_bytes = 4 * self.meta['STEPS']
+        profiling.add_bytes("raw.load_intensity", n_bytes)
+        with open(self.raw_file, "rb") as f:
+            f.seek(self.data_offset)
+            data = f.read(n_bytes)
+        if len(data) < n_bytes:
+            raise EOFError("Unexpected end of file")
+        self.read_intensity(data, copy=False)  # View of data, which holds only this block
 
 
 class RawFile:
     """Reader for Bruker raw data files (format version 4)."""
-    def __init__(self, raw_file_path):
-        assert os.path.exists(raw_file_path), f"Passed RawFile '{raw_file}' does not exist"
-        assert raw_file_path[-4:] == ".raw", f"Passed RawFile '{raw_file}' is not .raw"
+    def __init__(self, raw_file_path, use_numpy: bool = True, lazy: bool = False, data: bytes = None):
+        """
+        Parameters
+        ----------
+        raw_file_path : str
+            Path to the .raw file (any RAW4 file, the format is checked from its first bytes).
+        use_numpy : bool, optional
+            Memory-map the file and decode intensities into numpy arrays (default). Falls back to
+            the pure python (list-based) reader if numpy is not installed or use_numpy is False.
+        lazy : bool, optional
+            Only walk the global and per-range headers, recording the byte offset of each range's
+            intensity block. The intensities of a range are then read when its .I is first accessed.
+        data : bytes, optional
+            The contents of the file if already read (e.g. asynchronously), parsed instead of
+            reading raw_file_path. Can't be used with lazy.
+        """
+        if data is None:
+            assert os.path.exists(raw_file_path), f"Passed RawFile '{raw_file_path}' does not exist"
+        else:
+            assert not lazy, "Lazy loading reads from the file, pass data=None"
         self.raw_file = raw_file_path
-        # Open file as an io buffer and leave open to perform operations
-        self.f = open(raw_file_path, "rb")
+        self.use_numpy = use_numpy and _import_numpy() is not None
+        self.lazy = lazy
+        eager_numpy = self.use_numpy and not lazy
+        with profiling.stage("raw.open"):
+            if data is None:
+                self.length = os.stat(raw_file_path).st_size
+                # Open file as an io buffer and leave open to perform operations. Headers are read
+                # sequentially (no seeks) so a large buffer serves them in a handful of reads
+                self.f = open(raw_file_path, "rb", buffering=1 << 16)
+                # Whole file buffer to decode intensities from without copying. An empty file can't
+                # be mapped, it is left to load_raw4 to raise EOFError
+                try:
+                    self.buffer = (mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+                                   if eager_numpy and self.length > 0 else None)
+                except BaseException:
+                    self.f.close()
+                    raise
+            else:
+                self.length = len(data)
+                self.f = io.BytesIO(data)
+                self.buffer = data if eager_numpy else None
         # Get all the data from the file that we want and store it
-        self.length = len(self.f.read())
         self.offset = 0
         self.meta = dict()
         self.ranges = []
-        self.f.seek(0)
+        self.data_cache = dict()  # get_data results, keyed by (x_unit, y_unit)
         try:
-            self.load_raw4()
-            pass
+            with profiling.stage("raw.load_raw4"):
+                self.load_raw4()
+            profiling.add_bytes("raw.load_raw4", self.offset)  # Bytes walked through
         finally:
-            # After saving all the data, close the file, even if error
+            # After saving all the data, close the file (and memory map), even if error
+            if isinstance(self.buffer, mmap.mmap):
+                self.buffer.close()
+            self.buffer = None
             self.f.close()
             self.f = None
 
@@ -55,51 +200,38 @@ class RawFile:
         self.offset += length
         self.f.seek(self.offset)
 
-    def __read_string(self, length: int) -> str:
-        """Read a fixed-length string from binary file."""
+    def __read(self, length: int) -> bytes:
+        """Read a block of bytes from the current position of the binary file."""
         data = self.f.read(length)
         self.offset += length
-        self.f.seek(self.offset)
-        # Remove null bytes and decode
-        return data.strip(b'\x00').decode('utf-8', errors='ignore')
+        if len(data) < length:
+            raise EOFError("Unexpected end of file")
+        return data
+
+    def __output_path(self, suffix: str) -> str:
+        """Path of an output file: the raw file path with its extension (any case) replaced by suffix."""
+        out_file = os.path.splitext(self.raw_file)[0] + suffix
+        assert out_file != self.raw_file, f"Output file '{out_file}' would overwrite the raw file"
+        return out_file
 
     def __read_uint32_le(self) -> int:
         """Read a 32-bit unsigned integer (little-endian)."""
-        data = self.f.read(4)
-        self.offset += 4
-        self.f.seek(self.offset)
-        if len(data) < 4:
-            raise EOFError("Unexpected end of file")
-        return struct.unpack('<I', data)[0]
+        return int.from_bytes(self.__read(4), "little")
 
-    def __read_float_le(self) -> float:
-        """Read a 32-bit float (little-endian)."""
-        data = self.f.read(4)
-        self.offset += 4
-        self.f.seek(self.offset)
-        return struct.unpack('<f', data)[0]
-
-    def __read_double_le(self) -> float:
-        """Read a 64-bit double (little-endian)."""
-        data = self.f.read(8)
-        self.offset += 8
-        self.f.seek(self.offset)
-        return struct.unpack('<d', data)[0]
-    
 
     def load_raw4(self):
         """Parse the .raw file and extract the x and y values into stored data ranges"""
         assert self.f.closed == False, "File buffer has been closed, call __init__ to re-read data"
         # ---------- HEADER ----------
-        self.meta['version'] = self.__read_string(4)
-        self.__skip(8)
-        self.meta["MEASURE_DATE"] = self.__read_string(12)  # address 12
-        self.meta["MEASURE_TIME"] = self.__read_string(10)  # address 24
-        self.__skip(27)
+        version, date, time = _FILE_HEADER.unpack(self.__read(_FILE_HEADER.size))
+        self.meta['version'] = _decode_string(version)
+        assert self.meta['version'] == "RAW4", f"Passed RawFile '{self.raw_file}' is not a RAW4 file"
+        self.meta["MEASURE_DATE"] = _decode_string(date)  # address 12
+        self.meta["MEASURE_TIME"] = _decode_string(time)  # address 24
         # Offset = 61 = end of header
-        
+
         # ---------- HEADER ----------
-        # Loop through the global (scan-independent) metadata
+        # Loop through the global (scan-independent) metadata, reading each segment in one block
         # seg_types are 10 (var info), 30 (hardware info), 60 (drive info). 160 is data, after meta
         drive_num = 0
         while True:
@@ -108,107 +240,81 @@ class RawFile:
                 break  # Start of data range(s) so end of global metadata
             segment_len = self.__read_uint32_le()  # offset = 69
             assert segment_len >= 8, f"Invalid segment length: {segment_len}"
-            #print(f"seg_type = {segment_type}, seg_len = {segment_len}")
-    
+            body = self.__read(segment_len - 8)  # Segment contents, offset +8 onwards
+
             if segment_type == 5:  # HRXRD alignment info
-                # Substrate vectors (32 bytes)
-                self.__skip(8)
-                self.meta["SUBSTRATE NORM"] = self.__read_string(12)
-                self.meta["SUBSTRATE AZIMUTH"] = self.__read_string(12)
-                # Skip non-understood bytes
-                self.__skip(40)
-                # Sample vectors (24 bytes)
-                self.meta["SAMPLE NORMAL"] = self.__read_string(12)
-                self.meta["SAMPLE AZIMUTH"] = self.__read_string(12)
-                # Skip the rest of the bytes - don't know if they're significant
-                self.__skip(segment_len - (28 + 44 + 24 + 8))
-                
+                assert segment_len >= 8 + _SEG_ALIGNMENT.size, "HRXRD alignment segment too short"
+                # Substrate vectors, non-understood bytes, sample vectors, rest not known if significant
+                vectors = _SEG_ALIGNMENT.unpack_from(body)
+                for key, value in zip(["SUBSTRATE NORM", "SUBSTRATE AZIMUTH", "SAMPLE NORMAL", "SAMPLE AZIMUTH"], vectors):
+                    self.meta[key] = _decode_string(value)
+
             elif segment_type == 10:  # var info
                 assert segment_len >= 36, "var_info segment too short"
-                self.__skip(4)  # offset +8 before
-                tag_name = self.__read_string(24)  # offset +12
-                self.meta[tag_name] = self.__read_string(segment_len-36)  # offset +36
+                tag_name = _decode_string(_SEG_VAR_INFO.unpack_from(body)[0])  # offset +12
+                self.meta[tag_name] = _decode_string(body[_SEG_VAR_INFO.size:])  # offset +36
 
             elif segment_type == 30:  # hardware info
                 assert segment_len >= 120, "HardwareConfiguration segment too short"
-                self.__skip(64)  # offset +8 before
-                self.meta["ALPHA_AVERAGE"] = self.__read_double_le()  # offset +72
-                self.meta["ALPHA1"] = self.__read_double_le()  # offset +80
-                self.meta["ALPHA2"] = self.__read_double_le()  # offset +88
-                self.meta["BETA"] = self.__read_double_le()  # offset +96
-                self.meta["ALPHA_RATIO"] = self.__read_double_le()  # offset +104
-                self.__skip(4)  # offset +112
-                self.meta["ANODE_MATERIAL"] = self.__read_string(4)  # offset +116
-                self.__skip(segment_len-120)  # offset +120
+                values = _SEG_HARDWARE.unpack_from(body)  # offsets +72 to +120
+                for key, value in zip(["ALPHA_AVERAGE", "ALPHA1", "ALPHA2", "BETA", "ALPHA_RATIO"], values):
+                    self.meta[key] = value
+                self.meta["ANODE_MATERIAL"] = _decode_string(values[5])  # offset +116
 
             elif segment_type == 60:  # drive info
                 assert segment_len >= 76, "DriveAlignment segment too short"
-                self.meta[f"DRIVE{drive_num}_ALIGN_FLAG"] = self.__read_uint32_le()  # offset +8 before
-                self.meta[f"DRIVE{drive_num}_NAME"] = self.__read_string(24)  # offset +12
-                self.__skip(32)  # offset +36
-                self.meta[f"DRIVE{drive_num}_DELTA"] = self.__read_double_le()  # offset +68
-                self.__skip(segment_len-76)  # offset +76
+                flag, name, delta = _SEG_DRIVE_ALIGN.unpack_from(body)  # offsets +8, +12, +68
+                self.meta[f"DRIVE{drive_num}_ALIGN_FLAG"] = flag
+                self.meta[f"DRIVE{drive_num}_NAME"] = _decode_string(name)
+                self.meta[f"DRIVE{drive_num}_DELTA"] = delta
                 drive_num += 1
 
-            else:  # __skip unknown segment types
-                self.__skip(segment_len-8)
+            # Unknown segment types are skipped (already read as body)
 
         # Now process ranges
         range_num = -1
         while segment_type == 0 or segment_type == 160:
             range_num += 1
             d_range = DataRange()
-            # Primary range header
-            self.__skip(28)  # offset +4 before
-            d_range.meta["SCAN_TYPE"] = self.__read_string(24)  # offset +32
-            self.__skip(16)  # offset +56
-            d_range.meta["START_ANGLE"] = self.__read_double_le()  # offset +72
-            d_range.meta["STEP_SIZE"] = self.__read_double_le()  # offset +80
-            d_range.meta["STEPS"] = self.__read_uint32_le()  # offset +88
-            d_range.meta["TIME_PER_STEP"] = self.__read_float_le()  # offset +92
-            self.__skip(4)  # offset +96
-            d_range.meta["GENERATOR_VOLTAGE"] = self.__read_float_le()  # +100
-            d_range.meta["GENERATOR_CURRENT"] = self.__read_float_le()  # +104
-            self.__skip(4)  # offset +108
-            d_range.meta["USED_LAMBDA"] = self.__read_double_le()  # offset +112
-            self.__skip(16)  # offset +120
-            datum_size = self.__read_uint32_le()  # offset +136
-            hdr_size = self.__read_uint32_le()  # offset +140
-            self.__skip(16)  # offset +144
+            # Primary range header, offsets +4 to +160
+            scan_type, *values, datum_size, hdr_size = _RANGE_HEADER.unpack(self.__read(_RANGE_HEADER.size))
+            d_range.meta["SCAN_TYPE"] = _decode_string(scan_type)  # offset +32
+            for key, value in zip(["START_ANGLE", "STEP_SIZE", "STEPS", "TIME_PER_STEP", "GENERATOR_VOLTAGE",
+                                   "GENERATOR_CURRENT", "USED_LAMBDA"], values):  # offsets +72 to +120
+                d_range.meta[key] = value
 
             # Process Locked Coupled and Unlocked Coupled scan types
             if d_range.meta["SCAN_TYPE"] in ["Locked Coupled", "Unlocked Coupled", "PSD Fix Scan"]:
-                # Process remaining block headers
-                while hdr_size > 0:
-                    seg_type = self.__read_uint32_le()  # offset +0
-                    seg_len = self.__read_uint32_le()  # offset +4
+                # Process remaining block headers, all read as one block
+                block, pos = self.__read(hdr_size), 0
+                while pos < hdr_size:
+                    seg_type, seg_len = _SEGMENT_HEADER.unpack_from(block, pos)  # offset +0, +4
                     assert seg_len >= 8, f"Invalid segment length: {seg_len}"
 
                     if seg_type == 50:
                         assert seg_len >= 64, "Segment type 50 too short"
-                        self.__skip(4)  # offset +8
-                        seg_name = self.__read_string(24)  # offset +12
-
-                        if seg_name in ["Theta", "2Theta", "Divergence Slit", "Antiscattering Slit", "Phi", "Chi", "X-Drive", "Y-Drive", "Z-Drive"]:
-                            self.__skip(20)  # offset +36
-                            seg_value = self.__read_double_le()  # +56
+                        seg_name = _decode_string(_SEG_DRIVE_NAME.unpack_from(block, pos + 8)[0])  # offset +12
+                        if seg_name in _RANGE_DRIVES:
+                            seg_value = _SEG_DRIVE_VALUE.unpack_from(block, pos + 8)[0]  # +56
                             d_range.meta[f"{seg_name.upper().replace('-', '_')}"] = seg_value
-                            self.__skip(seg_len-64)
-                        else:
-                            self.__skip(seg_len-36)
-                            
-                    else:
-                        self.__skip(seg_len-8)
 
-                    hdr_size -= seg_len
+                    pos += seg_len
 
                 # Compute x values and read y values
                 assert datum_size == 4, f"Unexpected datum size: {datum_size}"
-                d_range.calculate_x()
-                d_range.I = []
-                for i in range(d_range.meta['STEPS']):
-                    d_range.I.append(self.__read_float_le() / d_range.meta["TIME_PER_STEP"])
-                assert len(d_range.tt) == len(d_range.I), f"x({len(d_range.tt)}) and y({len(d_range.I)}) vector lengths do not match!"
+                d_range.raw_file, d_range.data_offset = self.raw_file, self.offset
+                d_range.use_numpy = self.use_numpy
+                n_bytes = datum_size * d_range.meta['STEPS']
+                if self.lazy:
+                    self.__skip(n_bytes)
+                elif self.buffer is not None:
+                    d_range.read_intensity(self.buffer, self.offset)
+                    self.__skip(n_bytes)
+                else:
+                    d_range.read_intensity(self.__read(n_bytes))
+                if not self.lazy:
+                    n = len(d_range.counts)
+                    assert n == d_range.meta['STEPS'], f"x({d_range.meta['STEPS']}) and y({n}) vector lengths do not match!"
 
             else:  # __skip unknown scan types
                 d_range.meta["UNKNOWN_RANGE_SCAN_TYPE"] = "true"
@@ -237,7 +343,53 @@ class RawFile:
             Units to return for x, default "reciprocal" or "deg".
         y_unit : str, optional
             Units for the intensity, default "cps" or "counts".
+
+        Returns
+        -------
+        (x, I) for a single range, or (2Theta, omega, I) / (qx, qz, I) grids of shape
+        (n_ranges, steps) for multi-range (RSM) files. With numpy these are contiguous 2D arrays.
+        Results are cached per (x_unit, y_unit), so the returned arrays are shared between calls
+        and should be copied before being modified in place.
         """
+        key = (x_unit, y_unit)
+        if key not in self.data_cache:
+            with profiling.stage("raw.get_data"):
+                self.data_cache[key] = self.__get_data(x_unit, y_unit)
+        return self.data_cache[key]
+
+    def __get_data(self, x_unit: str, y_unit: str):
+        if self.use_numpy:
+            return self.__get_data_numpy(x_unit, y_unit)
+        return self.__get_data_python(x_unit, y_unit)
+
+    def __get_data_numpy(self, x_unit: str, y_unit: str):
+        """Vectorized get_data, computing the reciprocal space grids with broadcast trig."""
+        np = _import_numpy()
+        rad, dwell, lam = 0.01745329252, self.ranges[0].meta["TIME_PER_STEP"], self.meta['ALPHA_AVERAGE']
+        scale = 1 if y_unit=="CPS" else dwell
+        if len(self.ranges) == 1:
+            tt = np.asarray(self.ranges[0].tt, dtype=np.float64)
+            qz = 20*np.sin(tt/2 * rad) / lam  # in 1/nm
+            I = np.asarray(self.ranges[0].I, dtype=np.float64) * scale
+            return (tt if x_unit=="deg" else qz), I
+        else:
+            tths, Is = [r.tt for r in self.ranges], [r.I for r in self.ranges]
+            m = len(tths[0])
+            assert all(len(tt) == len(I) == m for tt, I in zip(tths, Is)), "Shape mismatch in theta, 2theta and intensity"
+            tth = np.array(tths, dtype=np.float64)  # All 2Theta ranges, (n, m)
+            th = np.array([r.meta['THETA'] for r in self.ranges], dtype=np.float64)[:, None]  # (n, 1)
+            w = np.repeat(th, m, axis=1)  # Theta value of each range, for every point
+            Is = np.array(Is, dtype=np.float64) * scale
+            if x_unit == "deg":
+                return tth, w, Is
+
+            qx = 10*(np.cos((tth-th)*rad) - np.cos(th*rad))/lam
+            qz = 10*(np.sin((tth-th)*rad) + np.sin(th*rad))/lam
+
+            return qx, qz, Is
+
+    def __get_data_python(self, x_unit: str, y_unit: str):
+        """List-based get_data, used when numpy is not available."""
         rad, dwell, lam = 0.01745329252, self.ranges[0].meta["TIME_PER_STEP"], self.meta['ALPHA_AVERAGE']
         if len(self.ranges) == 1:
             tt = self.ranges[0].tt
@@ -259,16 +411,89 @@ class RawFile:
             return qx, qz, Is
 
 
+    def get_rsm_grid(self, x_unit: str = "reciprocal", y_unit: str = "CPS", bins=(256, 256),
+                     extent=None, log: bool = False):
+        """
+        Resample the multi-range (RSM) data onto a regular 2D grid, averaging the intensity of
+        all points that fall in each bin (vectorized histogramming, weighted by the point counts).
+
+        Parameters
+        ----------
+        x_unit : str, optional
+            "reciprocal" (default) for a qx, qz (1/nm) grid, or "deg" for omega, 2Theta.
+        y_unit : str, optional
+            Units for the intensity, default "CPS" or "counts".
+        bins : int or (int, int), optional
+            Number of bins along x (qx/omega) and z (qz/2Theta), default (256, 256).
+        extent : ((x_min, x_max), (z_min, z_max)), optional
+            Grid limits, default the limits of the data.
+        log : bool, optional
+            Return log10 of the averaged intensity (non-positive values become NaN).
+
+        Returns
+        -------
+        x, z : np.ndarray
+            Bin centres along each axis.
+        grid : np.ndarray
+            Intensity of shape (len(z), len(x)), NaN where a bin contains no points.
+            Cached per set of arguments, like get_data.
+        """
+        np = _import_numpy()
+        if np is None:
+            raise ImportError("numpy is required to resample RSM data")
+        assert len(self.ranges) > 1, "RSM grid needs a multi-range file"
+        bins = (bins, bins) if isinstance(bins, int) else tuple(bins)
+        extent = tuple(map(tuple, extent)) if extent is not None else None
+        key = ("grid", x_unit, y_unit, bins, extent, log)
+        if key not in self.data_cache:
+            with profiling.stage("raw.get_rsm_grid"):
+                if x_unit == "deg":
+                    z, x, I = self.get_data("deg", y_unit)  # 2Theta, omega
+                else:
+                    x, z, I = self.get_data("reciprocal", y_unit)  # qx, qz
+                x, z, I = (np.asarray(a, dtype=np.float64).ravel() for a in (x, z, I))
+                sums, x_edges, z_edges = np.histogram2d(x, z, bins=bins, range=extent, weights=I)
+                n_points, _, _ = np.histogram2d(x, z, bins=(x_edges, z_edges))
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    grid = (sums / n_points).T  # NaN for empty bins, (z, x) for plotting as an image
+                    if log:
+                        grid = np.log10(np.where(grid > 0, grid, np.nan))
+                self.data_cache[key] = ((x_edges[1:] + x_edges[:-1]) / 2, (z_edges[1:] + z_edges[:-1]) / 2, grid)
+        return self.data_cache[key]
+
+    def save_rsm_grid(self, path: str = None, overwrite: bool = False, **kwargs):
+        """
+        Save the get_rsm_grid(**kwargs) map. Image paths (.png/.jpg/.tif) are saved as an image
+        with matplotlib, z increasing upwards, otherwise to a binary array file with save_binary
+        (.npz by default, or .h5/.hdf5) holding "x", "z" and "I" with the file and grid metadata.
+        """
+        out_file = path if path is not None else self.__output_path("_grid.npz")
+        if os.path.exists(out_file) and not overwrite:
+            print(f"{out_file} already exists!")
+            return
+        x, z, grid = self.get_rsm_grid(**kwargs)
+        if out_file.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff")):
+            import matplotlib.pyplot as plt
+            np = _import_numpy()
+            plt.imsave(out_file, np.flipud(grid), origin="upper")
+        else:
+            from binary_export import save_binary
+            meta = {"grid": kwargs, "meta": self.meta, "ranges": [r.meta for r in self.ranges]}
+            save_binary(out_file, {"x": x, "z": z, "I": grid}, meta)
+
+
     def get_json(self):
+        from binary_export import json_default
         return json.dumps({
             "offset":self.offset,
             "length":self.length,
             "meta":self.meta,
-            "ranges":[vars(r) for r in self.ranges]
-            }, indent=4)
+            "ranges":[{"meta":r.meta, "tt":r.tt, "I":r.I} for r in self.ranges]
+            }, indent=4, default=json_default)
     
     
-    def save_asc(self, x_unit: str = "deg", y_unit: str = "CPS"):
+    @profiling.profiled("raw.save_asc")
+    def save_asc(self, x_unit: str = "deg", y_unit: str = "CPS", overwrite: bool = False):
         """
         Save the data from the raw file to an asc file - ignore header.
 
@@ -278,45 +503,83 @@ class RawFile:
             Units to return for x, default "deg" or "reciprocal".
         y_unit : str, optional
             Units for the intensity, default "CPS" or "counts".
+        overwrite : bool, optional
+            Rewrite the .asc file if it already exists, default False.
+
+        Returns
+        -------
+        list of str
+            The file written, empty if it already existed.
         """
-        asc_file = self.raw_file.replace(".raw",".asc")
-        if os.path.exists(asc_file):
+        asc_file = self.__output_path(".asc")
+        if os.path.exists(asc_file) and not overwrite:
             print(f"{asc_file} already exists!")
-            return
+            return []
         print(f".\nExtracting x, y(, z) data from:\n\t{self.raw_file} -\n-> and saving to .asc format\n.")
         
+        from text_writer import write_columns
         tup = self.get_data(x_unit, y_unit)
         if len(tup) == 2:
             print(f"1D measurement: x and y data, ({len(tup[0])}, 2).")
-            hdr = "2Theta_deg  Counts"
-            try:
-                import numpy as np
-                print("saving 1D data - numpy")
-                np.savetxt(asc_file, np.stack(tup).T, fmt="%-14.5f%-10.5e", header=hdr)
-            except ImportError:
-                print("saving 1D data - manual python")
-                with open(asc_file, "w+") as f:
-                    f.write("#" + hdr + "\n")
-                    xs,ys = tup
-                    for x,y in zip(xs,ys):
-                        f.write(f"{x:<13.5f}{y:<10.5e}\n")            
-            
+            print("saving 1D data")
+            write_columns(asc_file, tup, fmt="%-14.5f%-10.5e", header="2Theta_deg  Counts")
+
         elif len(tup) == 3:
-            hdr = "2Theta_deg  omega_deg  Counts"
-            try:
-                import numpy as np
-                print("saving 2D data - numpy")
-                new_tup = tuple([np.array(t).flatten() for t in tup])
-                print(f"2D measurement: x, y and z data, (({len(tup[0])}, {len(tup[0][0])}), 3)->({len(new_tup[0])}, 3).")
-                np.savetxt(asc_file, np.stack(new_tup).T, fmt="%-13.5f%-11.5f%-10.5e", header=hdr)
-            except ImportError:
-                print("saving 2D data - manual python")
-                with open(asc_file, "w+") as f:
-                    f.write("#" + hdr + "\n")
-                    xs,ys,zs = tup
-                    for i in range(len(xs)):
-                        for j in range(len(xs[0])):
-                            f.write(f"{xs[i][j]:<13.5f}{ys[i][j]:<11.5f}{zs[i][j]:<10.5e}\n") 
+            print("saving 2D data")
+            if self.use_numpy:
+                new_tup = tuple([t.ravel() for t in tup])
+            else:
+                new_tup = tuple([[v for row in t for v in row] for t in tup])
+            print(f"2D measurement: x, y and z data, (({len(tup[0])}, {len(tup[0][0])}), 3)->({len(new_tup[0])}, 3).")
+            write_columns(asc_file, new_tup, fmt="%-13.5f%-11.5f%-10.5e", header="2Theta_deg  omega_deg  Counts")
+        return [asc_file]
+
+
+    @profiling.profiled("raw.save_binary")
+    def save_binary(self, path: str = None, x_unit: str = "deg", y_unit: str = "CPS", overwrite: bool = False):
+        """
+        Save the data and all parsed metadata (file and per-range) to a single binary file,
+        compressed .npz by default or HDF5 for a .h5/.hdf5 path (needs h5py). Read back with
+        binary_export.load_binary.
+
+        Parameters
+        ----------
+        path : str, optional
+            Output file, default is the raw file path with a .npz extension.
+        x_unit : str, optional
+            Units to save for x, default "deg" or "reciprocal".
+        y_unit : str, optional
+            Units for the intensity, default "CPS" or "counts".
+        overwrite : bool, optional
+            Rewrite the output file if it already exists, default False.
+
+        Returns
+        -------
+        list of str
+            The file written, empty if it already existed.
+        """
+        from binary_export import save_binary
+        out_file = path if path is not None else self.__output_path(".npz")
+        if os.path.exists(out_file) and not overwrite:
+            print(f"{out_file} already exists!")
+            return []
+
+        meta = {"x_unit": x_unit, "y_unit": y_unit, "meta": self.meta,
+                "ranges": [r.meta for r in self.ranges]}
+        save_binary(out_file, self.get_arrays(x_unit, y_unit), meta)
+        return [out_file]
+
+    def get_arrays(self, x_unit: str = "deg", y_unit: str = "CPS") -> dict:
+        """
+        The data of get_data as a dict of named arrays, "2Theta" (and "omega") or "qz" (and "qx")
+        depending on x_unit, and the intensity "I".
+        """
+        tup = self.get_data(x_unit, y_unit)
+        if len(tup) == 2:
+            names = ("2Theta", "I") if x_unit == "deg" else ("qz", "I")
+        else:
+            names = ("2Theta", "omega", "I") if x_unit == "deg" else ("qx", "qz", "I")
+        return dict(zip(names, tup))
             
 
 
@@ -324,22 +587,29 @@ class RawFile:
 #%% Code for right-click open-with execution, via .bat file
 if __name__ == "__main__":
     import sys
-    import os
 
-    if len(sys.argv) <= 1:
+    # "--profile" prints the time spent in each stage of the conversion
+    profile = "--profile" in sys.argv[1:]
+    raw_files = [arg for arg in sys.argv[1:] if arg != "--profile"]
+    if profile:
+        profiling.enable()
+
+    if len(raw_files) == 0:
         print("No argument passed")
     else:
-        for raw_file in sys.argv[1:]:
+        for raw_file in raw_files:
             if not os.path.exists(raw_file):
                 print(f"Passed RawFile '{raw_file}' does not exist")
                 continue
-            if not raw_file[-4:] == ".raw":
+            if not os.path.splitext(raw_file)[1].lower() == ".raw":
                 print(f"Passed RawFile '{raw_file}' is not .raw")
                 continue
             
             RawFile(raw_file).save_asc("deg", "counts")
                 
         print("---------- Done! ----------")
+        if profile:
+            print(profiling.get_profiler().report())
 
 
 
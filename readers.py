@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the file readers, with a single load() entry point for every supported format.
+
+Each reader declares the file extensions it handles, optionally the magic bytes its files start
+with and the companion files it needs (e.g. the .par of an .spc), plus functions to load a file
+into a Dataset and to convert it to text or binary. find_reader picks the reader of a file from
+its first bytes (magic) or else its extension, so batch tools (batch_convert) work with any
+registered format.
+
+Usage:
+    from readers import load
+    ds = load("scan.raw")  # or "sweep.spc"
+    ds.arrays["I"], ds.meta
+
+New formats are added with register_reader, e.g.:
+    register_reader("xy", [".xy"], load=load_xy, convert=convert_xy)
+"""
+import os
+
+
+class Dataset:
+    """
+    Uniform result of load().
+
+    Attributes
+    ----------
+    kind : str
+        Name of the reader that loaded the file.
+    path : str
+        The loaded file.
+    arrays : dict
+        Named data arrays (e.g. "2Theta" and "I", or "B" and "signal").
+    meta : dict
+        Metadata of the file.
+    source : object
+        The reader's own parsed object (e.g. RawFile or scan_params), for format-specific use.
+    """
+    def __init__(self, kind: str, path: str, arrays: dict, meta: dict, source=None):
+        self.kind = kind
+        self.path = path
+        self.arrays = arrays
+        self.meta = meta
+        self.source = source
+
+    def __repr__(self):
+        shapes = ", ".join(f"{k}{tuple(getattr(v, 'shape', (len(v),)))}" for k, v in self.arrays.items())
+        return f"Dataset(kind='{self.kind}', path='{self.path}', arrays=[{shapes}])"
+
+
+class Reader:
+    """
+    A registered file format.
+
+    Parameters
+    ----------
+    kind : str
+        Unique name of the format.
+    extensions : list of str
+        Lower case file extensions handled (with the dot), empty for any extension.
+    load : callable
+        load(path, **kwargs) -> Dataset.
+    convert : callable
+        convert(path, fmt, overwrite) writing the output next to the file, fmt is "text", "wide"
+        (text with 2D scans in a single file, where the format distinguishes) or "binary".
+        Returns the list of files written, empty if the outputs existed and not overwrite.
+    magic : bytes, optional
+        Bytes every file of the format starts with, checked when sniffing.
+    companions : list of str, optional
+        Extensions of the files that must exist alongside (same name), e.g. [".par"].
+    """
+    def __init__(self, kind: str, extensions, load, convert, magic: bytes = None, companions=()):
+        self.kind = kind
+        self.extensions = [e.lower() for e in extensions]
+        self.load = load
+        self.convert = convert
+        self.magic = magic
+        self.companions = list(companions)
+
+    def sources(self, path: str):
+        """All the files read when loading `path`: the file and its companions."""
+        base = os.path.splitext(path)[0]
+        return [path] + [base + ext for ext in self.companions]
+
+    def matches(self, path: str, head: bytes = None) -> bool:
+        """
+        Whether the file is of this format. If `head` (the first bytes of the file) is given and
+        the format has magic bytes, by the magic bytes alone, otherwise by the extension.
+        The companion files must exist either way.
+        """
+        if not all(os.path.exists(p) for p in self.sources(path)[1:]):
+            return False
+        if head is not None and self.magic is not None:
+            return head.startswith(self.magic)
+        return not self.extensions or os.path.splitext(path)[1].lower() in self.extensions
+
+
+_readers = dict()  # kind -> Reader, in order of registration
+
+
+def register_reader(kind: str, extensions, load, convert, magic: bytes = None, companions=()) -> Reader:
+    """Register (or replace) the reader of a file format, see Reader for the parameters."""
+    _readers[kind] = Reader(kind, extensions, load, convert, magic, companions)
+    return _readers[kind]
+
+
+def get_reader(kind: str) -> Reader:
+    """The registered reader named `kind`."""
+    if kind not in _readers:
+        raise KeyError(f"No reader registered for '{kind}', registered: {list(_readers)}")
+    return _readers[kind]
+
+
+def find_reader(path: str, sniff: bool = True):
+    """
+    The registered reader of the file, or None.
+    With `sniff` the first bytes of the file are read and the readers declaring magic bytes are
+    tried on them first, whatever the extension; formats without magic bytes are then matched by
+    extension. Without `sniff` only the extensions (and companion files) are checked, the file
+    isn't opened.
+    """
+    if sniff:
+        n = max((len(r.magic) for r in _readers.values() if r.magic), default=0)
+        with open(path, "rb") as f:
+            head = f.read(n)
+        for reader in _readers.values():
+            if reader.magic is not None and reader.matches(path, head):
+                return reader
+        readers = [r for r in _readers.values() if r.magic is None]
+    else:
+        readers = _readers.values()
+    for reader in readers:
+        if reader.matches(path):
+            return reader
+    return None
+
+
+def load(path: str, **kwargs) -> Dataset:
+    """Load any supported file into a Dataset, with the reader picked by find_reader."""
+    reader = find_reader(path)
+    if reader is None:
+        raise ValueError(f"No registered reader recognizes '{path}'")
+    return reader.load(path, **kwargs)
+
+
+#%% Built-in readers, their modules are only imported when a file is loaded or converted
+def _load_raw(path: str, **kwargs) -> Dataset:
+    from read_Bruker_raw import RawFile
+    raw = RawFile(path, **kwargs)
+    meta = {"meta": raw.meta, "ranges": [r.meta for r in raw.ranges]}
+    return Dataset("raw", path, raw.get_arrays(), meta, raw)
+
+
+def _convert_raw(path: str, fmt: str = "text", overwrite: bool = False):
+    from read_Bruker_raw import RawFile
+    raw = RawFile(path)
+    if fmt == "binary":
+        return raw.save_binary(overwrite=overwrite)
+    return raw.save_asc("deg", "counts", overwrite=overwrite)
+
+
+def _load_spc(path: str, silent: bool = True) -> Dataset:
+    from BrukerFMR_par_import import get_scan_params
+    from BrukerFMR_spc_par_to_csv import load_arrays
+    pars = get_scan_params(path, silent=silent)
+    return Dataset("spc", path, load_arrays(path, pars), vars(pars), pars)
+
+
+def _convert_spc(path: str, fmt: str = "text", overwrite: bool = False):
+    from BrukerFMR_spc_par_to_csv import create_csv, create_binary
+    if fmt == "binary":
+        return create_binary(path, overwrite=overwrite)
+    return create_csv(path, overwrite=overwrite, layout="wide" if fmt == "wide" else "slices")
+
+
+register_reader("raw", [".raw"], _load_raw, _convert_raw, magic=b"RAW4")
+# .spc files are headerless float32, recognized by extension and their .par file
+register_reader("spc", [".spc"], _load_spc, _convert_spc, companions=[".par"])
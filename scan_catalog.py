@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent SQLite catalog of the metadata of Bruker .raw and .spc/.par files.
+
+Indexing stores the key scan parameters of every file (scan_params fields for FMR, RawFile.meta
+and each DataRange.meta for .raw, read header-only with lazy=True) as columns, plus the full
+metadata as JSON. Re-indexing only re-parses files whose size or mtime changed, so questions like
+"all FMR angle-sweeps at 9.4 GHz" or "all Locked Coupled ranges with a Cu anode" are answered from
+the catalog without re-reading the archive.
+
+Usage:
+    python scan_catalog.py index ROOT [ROOT ...] [--db CATALOG]
+    python scan_catalog.py query [--db CATALOG] [--kind {raw,fmr}] [-f COLUMN=VALUE | COLUMN=LO:HI ...]
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from binary_export import json_default
+
+DEFAULT_DB = "scan_catalog.sqlite"
+
+# Queryable columns of the catalog tables, "ranges" holds one row per DataRange of a .raw file
+SCAN_COLUMNS = {
+    "path": "TEXT PRIMARY KEY", "kind": "TEXT", "size": "INTEGER", "mtime_ns": "INTEGER", "date": "TEXT",
+    "freq": "REAL", "power_uW": "REAL", "field_centre": "REAL", "field_sweep_width": "REAL",
+    "gonio": "REAL", "x_scan_type": "TEXT", "y_scan_type": "TEXT", "y_num": "INTEGER",
+    "anode": "TEXT", "n_ranges": "INTEGER", "meta": "TEXT",
+}
+RANGE_COLUMNS = {
+    "path": "TEXT", "range_num": "INTEGER", "scan_type": "TEXT", "theta": "REAL",
+    "start_angle": "REAL", "step_size": "REAL", "steps": "INTEGER", "meta": "TEXT",
+}
+
+
+def _fmr_row(path: str):
+    """Catalog row of an .spc/.par pair, from the .par file only."""
+    from BrukerFMR_par_import import get_scan_params
+    pars = get_scan_params(path)
+    row = {k: getattr(pars, k, None) for k in ("date", "freq", "power_uW", "field_centre",
+                                              "field_sweep_width", "gonio", "x_scan_type",
+                                              "y_scan_type", "y_num")}
+    row.update(kind="fmr", meta=json.dumps(vars(pars), default=json_default))
+    return row, []
+
+
+def _raw_row(path: str):
+    """Catalog row of a .raw file and one row per data range, from the headers only."""
+    from read_Bruker_raw import RawFile
+    raw = RawFile(path, lazy=True)
+    row = {"kind": "raw", "date": raw.meta.get("MEASURE_DATE"), "anode": raw.meta.get("ANODE_MATERIAL"),
+           "n_ranges": len(raw.ranges), "meta": json.dumps(raw.meta, default=json_default)}
+    ranges = [{"range_num": i, "scan_type": r.meta.get("SCAN_TYPE"), "theta": r.meta.get("THETA"),
+               "start_angle": r.meta.get("START_ANGLE"), "step_size": r.meta.get("STEP_SIZE"),
+               "steps": r.meta.get("STEPS"), "meta": json.dumps(r.meta, default=json_default)}
+              for i, r in enumerate(raw.ranges)]
+    return row, ranges
+
+
+class ScanCatalog:
+    """SQLite catalog of scan metadata, stored at `db_path`."""
+    def __init__(self, db_path: str = DEFAULT_DB):
+        self.db_path = db_path
+        self.con = sqlite3.connect(db_path)
+        self.con.row_factory = sqlite3.Row
+        with self.con:
+            cols = ", ".join(f"{k} {v}" for k, v in SCAN_COLUMNS.items())
+            self.con.execute(f"CREATE TABLE IF NOT EXISTS scans ({cols})")
+            cols = ", ".join(f"{k} {v}" for k, v in RANGE_COLUMNS.items())
+            self.con.execute(f"CREATE TABLE IF NOT EXISTS ranges ({cols}, PRIMARY KEY (path, range_num))")
+            for table, col in [("scans", "kind"), ("scans", "freq"), ("scans", "y_scan_type"),
+                               ("scans", "anode"), ("ranges", "scan_type")]:
+                self.con.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table} ({col})")
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update(self, roots, silent: bool = True):
+        """
+        Incrementally index all .raw and .spc/.par files under `roots`: new or modified files
+        (size or mtime changed) are parsed, files that no longer exist are removed.
+
+        Returns
+        -------
+        dict with the number of files added/updated, unchanged, removed and failed.
+        """
+        from batch_convert import discover
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        known = {row["path"]: (row["size"], row["mtime_ns"])
+                 for row in self.con.execute("SELECT path, size, mtime_ns FROM scans")}
+        for root in roots:
+            root = os.path.abspath(root)
+            found, parsed = set(), []
+            for kind, path in discover([root]):
+                path = os.path.abspath(path)
+                found.add(path)
+                par = path[:-4] + ".par" if kind == "spc" else path  # The metadata source
+                st = os.stat(par)
+                if known.get(path) == (st.st_size, st.st_mtime_ns):
+                    counts["unchanged"] += 1
+                    continue
+                try:
+                    row, ranges = _fmr_row(path) if kind == "spc" else _raw_row(path)
+                except Exception as e:
+                    counts["failed"] += 1
+                    if not silent: print(f"FAILED {path}\n\t{type(e).__name__}: {e}", file=sys.stderr)
+                    continue
+                row.update(path=path, size=st.st_size, mtime_ns=st.st_mtime_ns)
+                parsed.append((row, ranges))
+
+            # Store the parsed files and drop the deleted ones of this root in a single transaction
+            prefix = root.rstrip(os.sep) + os.sep
+            gone = [p for p in known if (p.startswith(prefix) or p == root) and p not in found]
+            with self.con:
+                for row, ranges in parsed:
+                    self.__store(row, ranges)
+                for path in gone:
+                    self.con.execute("DELETE FROM scans WHERE path = ?", (path,))
+                    self.con.execute("DELETE FROM ranges WHERE path = ?", (path,))
+            counts["indexed"] += len(parsed)
+            counts["removed"] += len(gone)
+        return counts
+
+    def __store(self, row: dict, ranges: list):
+        """Insert or replace a file and its ranges, within the caller's transaction."""
+        self.con.execute(f"INSERT OR REPLACE INTO scans ({', '.join(row)}) VALUES ({', '.join('?'*len(row))})",
+                         tuple(row.values()))
+        self.con.execute("DELETE FROM ranges WHERE path = ?", (row["path"],))
+        for r in ranges:
+            r["path"] = row["path"]
+            self.con.execute(f"INSERT INTO ranges ({', '.join(r)}) VALUES ({', '.join('?'*len(r))})",
+                             tuple(r.values()))
+
+    def query(self, kind: str = None, **filters):
+        """
+        Find scans by their catalog columns, e.g.
+            query("fmr", freq=(9.3, 9.5), y_scan_type="angle-sweep")
+            query("raw", scan_type="Locked Coupled", anode="Cu")
+        A value matches exactly, a (low, high) tuple matches an inclusive range (None = open).
+        Range columns (scan_type, theta, start_angle, ...) match files with any such range.
+
+        Returns
+        -------
+        list of dicts of the matching scans' columns, with "meta" decoded from JSON.
+        """
+        if kind is not None:
+            filters["kind"] = kind
+        where, args = [], []
+        for col, value in filters.items():
+            if col in SCAN_COLUMNS:
+                name = f"s.{col}"
+            elif col in RANGE_COLUMNS:
+                name = f"r.{col}"
+            else:
+                raise KeyError(f"Unknown catalog column '{col}'")
+            if isinstance(value, (tuple, list)):
+                low, high = value
+                if low is not None:
+                    where.append(f"{name} >= ?")
+                    args.append(low)
+                if high is not None:
+                    where.append(f"{name} <= ?")
+                    args.append(high)
+            else:
+                where.append(f"{name} = ?")
+                args.append(value)
+
+        sql = "SELECT DISTINCT s.* FROM scans s"
+        if any(col in RANGE_COLUMNS and col not in SCAN_COLUMNS for col in filters):
+            sql += " JOIN ranges r ON r.path = s.path"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY s.path"
+        rows = [dict(row) for row in self.con.execute(sql, args)]
+        for row in rows:
+            row["meta"] = json.loads(row["meta"])
+        return rows
+
+
+def _parse_filter(text: str):
+    """Parse a CLI filter "COLUMN=VALUE" or "COLUMN=LOW:HIGH" (numbers where possible)."""
+    def number(v):
+        if v == "":
+            return None
+        try:
+            return float(v)
+        except ValueError:
+            return v
+    col, _, value = text.partition("=")
+    if ":" in value:
+        low, _, high = value.partition(":")
+        return col, (number(low), number(high))
+    return col, number(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and search the metadata of Bruker scans.")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"Catalog file (default: {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_index = sub.add_parser("index", help="Add new/modified files under the roots to the catalog")
+    p_index.add_argument("roots", nargs="+")
+    p_query = sub.add_parser("query", help="List the scans matching all filters")
+    p_query.add_argument("--kind", choices=["raw", "fmr"])
+    p_query.add_argument("-f", "--filter", action="append", default=[], metavar="COLUMN=VALUE|LOW:HIGH",
+                         help=f"Columns: {', '.join(sorted((set(SCAN_COLUMNS) | set(RANGE_COLUMNS)) - {'meta'}))}")
+    args = parser.parse_args(argv)
+
+    with ScanCatalog(args.db) as catalog:
+        if args.command == "index":
+            counts = catalog.update(args.roots, silent=False)
+            print(", ".join(f"{v} {k}" for k, v in counts.items()))
+        else:
+            for row in catalog.query(args.kind, **dict(_parse_filter(f) for f in args.filter)):
+                print(row["path"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())